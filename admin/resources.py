@@ -1,9 +1,11 @@
-from fastapi import Request
+from fastapi import HTTPException, Request, status
+from tortoise.queryset import QuerySet
 from fastapi_admin.enums import Method
 from fastapi_admin.app import app
 from fastapi_admin.resources import Action, Dropdown, Link, Field, Model, ToolbarAction, ComputeField
 from fastapi_admin.widgets import filters, inputs, displays
 
+from dependencies.ledger import accounts_with_balance, get_balance, get_balances
 from models.admin import Admin
 from models.account import AccountORM, DepositORM, WithdrawalORM, PlanORM, ReferralORM
 from models.user import UserORM
@@ -22,12 +24,55 @@ class UserName(ComputeField):
             return await model.get(pk=obj.get(self.name))
         return obj.get(self.name)
 
+    async def get_values(self, request: Request, objs: list[dict]) -> list:
+        ids = [obj.get(self.name) for obj in objs]
+        if not (model := self.input.model):
+            return ids
+        related = {obj.pk: obj for obj in await model.filter(pk__in=set(ids))}
+        return [related.get(pk) for pk in ids]
+
 
 class AccountName(ComputeField):
     async def get_value(self, request: Request, obj: dict):
         val = await AccountORM.get(pk=obj.get(self.name)).prefetch_related('user')
         return val.user.email
 
+    async def get_values(self, request: Request, objs: list[dict]) -> list:
+        ids = [obj.get(self.name) for obj in objs]
+        emails = dict(await AccountORM.filter(pk__in=set(ids)).values_list('account_id', 'user__email'))
+        return [emails.get(pk) for pk in ids]
+
+
+class Balance(ComputeField):
+    """The current balance, the checkpoint plus the ledger entries not checkpointed yet, read only."""
+
+    async def get_value(self, request: Request, obj: dict):
+        return await get_balance(obj.get("account_id"))
+
+    async def get_values(self, request: Request, objs: list[dict]) -> list:
+        balances = await get_balances({obj.get("account_id") for obj in objs})
+        return [balances.get(obj.get("account_id")) for obj in objs]
+
+
+class BalanceFilter(filters.Search):
+    """Filter accounts on their current balance, a minimum or a "min, max" range."""
+
+    async def parse_value(self, request: Request, value: str):
+        try:
+            bounds = [float(bound) for bound in value.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Balance filter takes min or min, max")
+        return bounds[0], bounds[1] if len(bounds) > 1 else None
+
+    async def get_queryset(self, request: Request, value: str, qs: QuerySet):
+        low, high = await self.parse_value(request, value)
+        return qs.filter(account_id__in=await accounts_with_balance(low, high))
+
+    async def render(self, request: Request, value):
+        if isinstance(value, tuple):
+            value = ", ".join(f"{bound:g}" for bound in value if bound is not None)
+        return await super().render(request, value)
+
 
 @app.register
 class AdminResource(Model):
@@ -95,16 +140,15 @@ class AccountResource(Model):
     page_pre_title = "Accounts"
     page_title = "Account"
     fields = [
-        "balance",
+        Balance(name="balance", label="Balance", input_=inputs.DisplayOnly()),
         "account_id",
-        UserName(name='user_id', label="User", input_=inputs.ForeignKey(model=UserORM))
+        UserName(name='user_id', label="User", input_=inputs.ForeignKey(model=UserORM, autocomplete=True, search_field="email"))
     ]
     filters = [
-        filters.Search(
+        BalanceFilter(
             name="balance",
             label="Account Balance",
-            search_mode="range",
-            placeholder="search by balance"
+            placeholder="min or min, max"
         )
     ]
 
@@ -116,6 +160,8 @@ class DepositResource(Model):
     model = DepositORM
     page_pre_title = "Deposits"
     page_title = "Deposits"
+    approximate_count_threshold = 100000
+    pagination = "keyset"
     fields = [
         "amount",
         "settled",
@@ -143,12 +189,21 @@ class DepositResource(Model):
         actions.extend((settle, confirm))
         return actions
 
+    async def get_bulk_actions(self, request: Request) -> list[Action]:
+        actions = await super().get_bulk_actions(request=request)
+        confirm = Action(label="confirm selected", icon="ti ti-check", name="bulk_confirm", method=Method.POST)
+        settle = Action(label="settle selected", icon="ti ti-check", name="bulk_settle_deposit", method=Method.POST)
+        actions.extend((settle, confirm))
+        return actions
+
 
 @app.register
 class WithdrawalResource(Model):
     label = "Withdrawal"
     model = WithdrawalORM
     page_title = "Withdrawals"
+    approximate_count_threshold = 100000
+    pagination = "keyset"
     fields = [
         "amount",
         "paid",
@@ -162,3 +217,9 @@ class WithdrawalResource(Model):
         confirm = Action(label="settle", icon="ti ti-edit", name="settle", method=Method.POST)
         actions.append(confirm)
         return actions
+
+    async def get_bulk_actions(self, request: Request) -> list[Action]:
+        actions = await super().get_bulk_actions(request=request)
+        settle = Action(label="settle selected", icon="ti ti-check", name="bulk_settle", method=Method.POST)
+        actions.append(settle)
+        return actions
@@ -1,18 +1,39 @@
-from fastapi import Depends, Request
-from fastapi_admin.depends import get_resources
+import asyncio
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi_admin.depends import get_current_admin, get_resources
 from fastapi_admin.template import templates
 from fastapi_admin.app import app
 
-from dependencies.account import confirm_deposit, complete_withdrawal, settle_deposit as settle
+from dependencies.account import (confirm_deposit, complete_withdrawal, settle_deposit as settle, confirm_deposits, settle_selected_deposits,
+                                  complete_withdrawals)
+from dependencies.maturity import maturity_scheduler
+from dependencies.metrics import dashboard_metrics
+from dependencies.outbox import outbox_dispatcher
+from models.account import BulkReport
+
 
+def selected_ids(ids: str) -> list[int]:
+    """ids of a bulk action, deduplicated and sorted so concurrent chunks lock rows in the same order"""
+    try:
+        return sorted({int(pk) for pk in ids.split(",") if pk})
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be a comma separated list of integers")
 
-@app.get("/")
+
+@app.get("/", dependencies=[Depends(get_current_admin)])
 async def home(request: Request, resources=Depends(get_resources)):
+    metrics, outbox_depth = await asyncio.gather(dashboard_metrics.snapshot(), outbox_dispatcher.depth())
+    # the login provider registers itself on the admin app under its name
+    provider = getattr(request.app, "login_provider", None)
     return templates.TemplateResponse(
         "dashboard.html",
         context={
             "request": request,
             "resources": resources,
+            "metrics": metrics,
+            "outbox_depth": outbox_depth,
+            "session_stats": provider.session_stats() if provider else None,
             "resource_label": "Dashboard",
             "page_pre_title": "overview",
             "page_title": "Dashboard",
@@ -20,18 +41,33 @@ async def home(request: Request, resources=Depends(get_resources)):
 )
 
 
-@app.post("/{resource}/confirm/{deposit_id}")
+@app.post("/{resource}/confirm/{deposit_id}", dependencies=[Depends(get_current_admin)])
 async def confirm_deposit(msg: dict = Depends(confirm_deposit)):
     return msg
 
 
-@app.post("/{resource}/settle_deposit/{deposit_id}")
+@app.post("/{resource}/settle_deposit/{deposit_id}", dependencies=[Depends(get_current_admin)])
 async def settle_deposit(msg: dict = Depends(settle)):
     return msg
 
 
-@app.post("/{resource}/settle/{wit_id}")
+@app.post("/{resource}/settle/{wit_id}", dependencies=[Depends(get_current_admin)])
 async def settle_withdrawal(request: Request, msg: dict = Depends(complete_withdrawal)):
     return msg
 
 
+@app.post("/{resource}/bulk_confirm", response_model=BulkReport, dependencies=[Depends(get_current_admin)])
+async def bulk_confirm_deposits(ids: list[int] = Depends(selected_ids)):
+    report = await confirm_deposits(ids)
+    await maturity_scheduler.schedule(ids)
+    return report
+
+
+@app.post("/{resource}/bulk_settle_deposit", response_model=BulkReport, dependencies=[Depends(get_current_admin)])
+async def bulk_settle_deposits(ids: list[int] = Depends(selected_ids)):
+    return await settle_selected_deposits(ids)
+
+
+@app.post("/{resource}/bulk_settle", response_model=BulkReport, dependencies=[Depends(get_current_admin)])
+async def bulk_complete_withdrawals(ids: list[int] = Depends(selected_ids)):
+    return await complete_withdrawals(ids)
@@ -1,3 +1,4 @@
+import logging
 import pathlib
 
 import aioredis
@@ -13,9 +14,17 @@ from tortoise.contrib.fastapi import register_tortoise
 from admin import app as admin_app, Admin, LoginProvider
 from config.db import TORTOISE_ORM
 from config.env import env
-from dependencies.account import settle_deposits
+from dependencies.ledger import compact_ledger
+from dependencies.maturity import maturity_scheduler
+from dependencies.metrics import dashboard_metrics
+from dependencies.outbox import outbox_dispatcher
 from routes import user_router, auth_router
 from utils import HttpExceptionResponse, RequestValidationErrorResponse
+from utils.cache import user_cache
+from utils.emails import smtp_pool, Email
+from fastapi_admin.template import precompile, set_bytecode_cache
+
+logger = logging.getLogger(__name__)
 
 origins = [
     "http:localhost:4200",
@@ -75,6 +84,11 @@ app.add_middleware(
 @app.on_event('startup')
 async def startup():
     redis = aioredis.from_url(url=env.REDIS_URL, decode_responses=True, encoding='utf8')
+    template_cache_dir = env.BASE_DIR / (env.TEMPLATE_CACHE_DIR or '.template_cache')
+    precompile_templates = (env.TEMPLATE_PRECOMPILE or "").strip().lower() in ("1", "true", "yes")
+    # the one environment every Email renders through, the cache and precompiled templates have to land on it
+    email_env = Email.fast_mail.template_env
+    set_bytecode_cache(str(template_cache_dir / 'email'), email_env)
     await admin_app.configure(
         logo_url="https://preview.tabler.io/static/logo-white.svg",
         template_folders=[env.BASE_DIR / 'templates/admin'],
@@ -86,7 +100,28 @@ async def startup():
             )
         ],
         redis=redis,
+        template_cache_dir=str(template_cache_dir / 'admin'),
+        precompile_templates=precompile_templates,
     )
+    if precompile_templates:
+        logger.info("Admin templates precompiled: %s", admin_app.template_stats)
+        logger.info("Email templates precompiled: %s", precompile(email_env))
+    if env.USER_CACHE_REDIS:
+        user_cache.redis = aioredis.from_url(url=env.REDIS_URL)
+    user_cache.start(redis)
+    maturity_scheduler.start()
+    outbox_dispatcher.start()
+    dashboard_metrics.start(redis)
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(settle_deposits, 'cron', hour=23, minute=59, timezone="Africa/Lagos")
+    scheduler.add_job(maturity_scheduler.rebuild, 'interval', minutes=int(env.MATURITY_REBUILD_MINUTES or 10))
+    scheduler.add_job(dashboard_metrics.refresh, 'interval', minutes=int(env.METRICS_RECOMPUTE_MINUTES or 15))
+    scheduler.add_job(compact_ledger, 'interval', seconds=int(env.LEDGER_COMPACTION_SECONDS or 60), max_instances=1)
     scheduler.start()
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    await maturity_scheduler.stop()
+    await outbox_dispatcher.stop()
+    await user_cache.stop()
+    await smtp_pool.close()
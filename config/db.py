@@ -16,7 +16,7 @@ TORTOISE_ORM = {
     },
     "apps": {
         "models": {
-            "models": ["models.user", "models.account", "models.admin", "aerich.models"],
+            "models": ["models.user", "models.account", "models.admin", "models.outbox", "aerich.models"],
             "default_connection": "staging"
         }
     },
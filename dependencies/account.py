@@ -1,23 +1,29 @@
+import logging
+from time import perf_counter
+from typing import Awaitable, Callable, Optional
+
 from fastapi import Request
 
 from tortoise.transactions import in_transaction
-from tortoise.expressions import F
+from config.env import env
+from models.outbox import OutboxORM
 from models.account import (Withdrawal, WithdrawalCreate, Deposit, ReferralORM, WithdrawalORM, DepositORM, AccountORM, Account, PlanORM, Plan,
-                            DepositCreate)
+                            DepositCreate, SettlementReport, BulkChunk, BulkReport, LedgerORM, LedgerKind)
 
 from utils.emails import DepositReceivedEmail, WithdrawalEmail, ReferralEmail, DepositConfirmationEmail, AccountAlertEmail
-from utils import now, error_handler, ResponseModel
+from utils import now, error_handler, ResponseModel, locked_rows
+from utils.cache import user_cache
+from .ledger import debit_account, post_entries
+from .metrics import dashboard_metrics
 
+logger = logging.getLogger(__name__)
 
-async def create_account(account: Account) -> AccountORM:
-    return await AccountORM.create(**account.dict())
+SETTLEMENT_CHUNK_SIZE = int(env.SETTLEMENT_CHUNK_SIZE or 500)
+BULK_CHUNK_SIZE = int(env.BULK_CHUNK_SIZE or 200)
 
 
-async def update_account(*, acc_id: int, **kwargs):
-    account = await AccountORM.get(account_id=acc_id)
-    await account.update_from_dict(kwargs)
-    await account.save(update_fields=list(kwargs.keys()))
-    return True
+async def create_account(account: Account) -> AccountORM:
+    return await AccountORM.create(**account.dict())
 
 
 @error_handler(error="Unable to create deposit")
@@ -28,40 +34,95 @@ async def create_deposit(req: Request, deposit: DepositCreate) -> ResponseModel:
         deposit = Deposit(**deposit.dict())
         dep = await DepositORM.create(**deposit.dict(exclude_none=True), account_id=req.state.user.account.account_id)
         email = DepositReceivedEmail(name=req.state.user.name, recipients=[req.state.user.email], plan=plan.name, amount=dep.amount)
-        await email.send()
+        await email.queue()
         return ResponseModel(message=f"Deposit of {dep.amount} Successfully Logged")
 
 
-async def settle_deposits():
-    try:
-        async with in_transaction():
-            deposits = DepositORM.filter(confirmed=True, settled=False, due_date__lte=now()).prefetch_related('account__user')
-            async for deposit in deposits:
-                await deposit.update_from_dict({"settled": True})
-                await deposit.save(update_fields=("settled",))
-                deposit.account.balance = F("balance") + deposit.amount_due
-                await deposit.account.save(update_fields=("balance",))
-                message = f"Your Deposit has matured and your account has been credited with {deposit.amount_due}"
-                user = deposit.account.user
-                email = AccountAlertEmail(name=user.name, recipients=[user.email], message=message)
-                await email.send()
-    except Exception as err:
-        print(err)
+async def queue_settlement_emails(rows: list[dict], using_db=None):
+    users = await AccountORM.filter(account_id__in={row["account_id"] for row in rows}).using_db(using_db)\
+        .values("account_id", "user__name", "user__email")
+    users = {user["account_id"]: user for user in users}
+    entries = []
+    for row in rows:
+        if not (user := users.get(row["account_id"])):
+            continue
+        message = f"Your Deposit has matured and your account has been credited with {row['amount_due']}"
+        email = AccountAlertEmail(name=user["user__name"], recipients=[user["user__email"]], message=message)
+        entries.append(email.outbox_entry())
+    await OutboxORM.bulk_create(entries, using_db=using_db)
+
+
+SETTLE_FIELDS = ("deposit_id", "account_id", "amount_due", "amount", "plan_id")
+
+
+async def settle_rows(rows: list[dict], using_db=None) -> int:
+    """Mark deposit rows settled, credit their accounts and queue the alerts, returns the number of accounts credited.
+
+    The rows must have been read unsettled with `locked_rows` in the same transaction. The UPDATE only flips deposits still
+    unsettled, and if any of them was settled elsewhere the whole chunk is rolled back rather than credited twice.
+    """
+    changed = await DepositORM.filter(deposit_id__in=[row["deposit_id"] for row in rows], settled=False).using_db(using_db)\
+        .update(settled=True)
+    if changed != len(rows):
+        raise RuntimeError(f"{len(rows) - changed} of {len(rows)} deposits were settled concurrently")
+    await post_entries([LedgerORM(account_id=row["account_id"], amount=row["amount_due"] or 0, kind=LedgerKind.settlement,
+                                  reference=row["deposit_id"]) for row in rows], using_db=using_db)
+    await queue_settlement_emails(rows, using_db=using_db)
+    await dashboard_metrics.record_deposits(rows, "confirmed", "settled")
+    return len({row["account_id"] for row in rows})
+
+
+async def settle_deposits(*, chunk_size: int = SETTLEMENT_CHUNK_SIZE, deposit_ids: Optional[list[int]] = None) -> SettlementReport:
+    """Settle matured deposits in chunks, optionally restricted to deposit_ids.
+
+    Each chunk locks its deposits, marks them settled with a set-based UPDATE, appends one ledger entry per deposit and commits
+    on its own, so locks are only held for the duration of a chunk and no Accounts row is locked at all. A concurrent settler
+    waits on the locked deposits and then no longer sees them as unsettled. Notifications are written to the outbox in the same
+    transaction.
+    """
+    report = SettlementReport()
+    cutoff = now()
+    last_id = 0
+    start = perf_counter()
+    while True:
+        try:
+            async with in_transaction() as conn:
+                qs = DepositORM.filter(confirmed=True, settled=False, due_date__lte=cutoff, deposit_id__gt=last_id)
+                if deposit_ids is not None:
+                    qs = qs.filter(deposit_id__in=deposit_ids)
+                rows = await locked_rows(qs.order_by("deposit_id").limit(chunk_size), *SETTLE_FIELDS, using_db=conn)
+                if not rows:
+                    break
+                accounts = await settle_rows(rows, using_db=conn)
+        except Exception as err:
+            logger.exception("Settlement chunk after deposit %s failed: %s", last_id, err)
+            break
+        last_id = rows[-1]["deposit_id"]
+        report.chunks += 1
+        report.deposits += len(rows)
+        report.accounts += accounts
+    report.elapsed = perf_counter() - start
+    logger.info("Settled %s deposits across %s accounts in %s chunks (%.1f rows/s)", report.deposits, report.accounts, report.chunks,
+                report.rows_per_second)
+    return report
 
 
 @error_handler(error="Unable to settle deposit")
 async def settle_deposit(*, deposit_id: int) -> ResponseModel:
-    async with in_transaction():
-        deposit = await DepositORM.get(deposit_id=deposit_id).prefetch_related("account__user")
+    async with in_transaction() as conn:
+        deposit = await DepositORM.filter(deposit_id=deposit_id, settled=False).select_for_update().using_db(conn).first()
+        if deposit is None:
+            return ResponseModel(message="Deposit not found or already settled", status=False)
+        await deposit.fetch_related("account__user", using_db=conn)
         account = deposit.account
         user = account.user
         dep = await deposit.update_from_dict({"settled": True})
         await dep.save(update_fields=("settled",))
-        account.balance = F("balance") + deposit.amount_due
-        await account.save(update_fields=("balance",))
+        await post_entries([LedgerORM(account_id=account.account_id, amount=deposit.amount_due, kind=LedgerKind.settlement,
+                                      reference=deposit.deposit_id)])
         message = f"Your deposit has matured and your account has been credited with {deposit.amount_due}"
         email = AccountAlertEmail(name=user.email, recipients=[user.email], message=message)
-        await email.send()
+        await email.queue()
         return ResponseModel(message="Deposit Settled")
 
 
@@ -86,7 +147,7 @@ async def confirm_deposit(*, deposit_id) -> ResponseModel:
         user = account.user
         email = DepositConfirmationEmail(name=user.name, payment_date=deposit.payment_date, due_date=deposit.due_date, plan=plan.name,
                                          amount=deposit.amount, deposit_id=deposit_id, recipients=[user.email])
-        await email.send()
+        await email.queue()
         return ResponseModel(message="Successfully Confirmed Deposit")
 
 
@@ -97,39 +158,169 @@ async def pay_referral(referral: ReferralORM, amount: float):
             ref = await referral.update_from_dict({"amount": amount, "paid": True})
             await ref.save(update_fields=("amount", "paid"))
             acc = referral.referrer.account
-            acc.balance = F("balance") + amount
-            await acc.save(update_fields=("balance",))
+            await post_entries([LedgerORM(account_id=acc.account_id, amount=amount, kind=LedgerKind.referral, reference=referral.ref_id)])
             user = referral.referrer
             message = f"""You have received a sum ${amount} for referring {referral.referred.name}"""
             email = ReferralEmail(name=user.name, recipients=[user.email], message=message)
-            await email.send()
+            await email.queue()
     except Exception as err:
         print(err)
 
 
+async def pay_referrals(amounts: dict[int, float], using_db=None):
+    """Pay the unpaid referral bonus of the users owning the accounts in amounts, keyed by account_id, in one pass."""
+    owners = dict(await AccountORM.filter(account_id__in=list(amounts)).using_db(using_db).values_list("user_id", "account_id"))
+    if not owners:
+        return
+    referrals = await ReferralORM.filter(paid=False, referred_id__in=list(owners)).select_for_update().using_db(using_db)
+    if not referrals:
+        return
+    for referral in referrals:
+        referral.amount, referral.paid = amounts[owners[referral.referred_id]], True
+    await ReferralORM.bulk_update(referrals, fields=["amount", "paid"], using_db=using_db)
+
+    user_ids = {referral.referrer_id for referral in referrals} | {referral.referred_id for referral in referrals}
+    users = {user["user_id"]: user for user in await AccountORM.filter(user_id__in=user_ids).using_db(using_db)
+             .values("user_id", "account_id", "user__name", "user__email")}
+    credits = []
+    entries = []
+    for referral in referrals:
+        if not (referrer := users.get(referral.referrer_id)):
+            continue
+        credits.append(LedgerORM(account_id=referrer["account_id"], amount=referral.amount, kind=LedgerKind.referral,
+                                 reference=referral.ref_id))
+        referred = users.get(referral.referred_id, {}).get("user__name", "")
+        message = f"""You have received a sum ${referral.amount} for referring {referred}"""
+        email = ReferralEmail(name=referrer["user__name"], recipients=[referrer["user__email"]], message=message)
+        entries.append(email.outbox_entry())
+    await post_entries(credits, using_db=using_db)
+    await OutboxORM.bulk_create(entries, using_db=using_db)
+
+
+async def run_in_chunks(ids: list[int], action: Callable[[list[int], object], Awaitable[int]], *,
+                        chunk_size: int = BULK_CHUNK_SIZE) -> BulkReport:
+    """Run action over ids one chunk per transaction, a failed chunk is rolled back and reported without stopping the rest."""
+    report = BulkReport(requested=len(ids))
+    start = perf_counter()
+    for i in range(0, len(ids), chunk_size):
+        chunk = BulkChunk(requested=len(ids[i:i + chunk_size]))
+        chunk_start = perf_counter()
+        try:
+            async with in_transaction() as conn:
+                chunk.processed = await action(ids[i:i + chunk_size], conn)
+        except Exception as err:
+            logger.exception("Bulk %s chunk at %s failed: %s", action.__name__, ids[i], err)
+            chunk.failed = True
+        chunk.elapsed = perf_counter() - chunk_start
+        report.processed += chunk.processed
+        report.chunks.append(chunk)
+    report.elapsed = perf_counter() - start
+    return report
+
+
+async def confirm_deposit_chunk(ids: list[int], conn) -> int:
+    deposits = await DepositORM.filter(deposit_id__in=ids, confirmed=False, plan_id__not_isnull=True).order_by("deposit_id")\
+        .select_for_update().using_db(conn)
+    if not deposits:
+        return 0
+    plans = {plan.name: Plan.from_orm(plan) for plan in await PlanORM.filter(name__in={d.plan_id for d in deposits}).using_db(conn)}
+    referral_amounts = {}
+    for deposit in deposits:
+        plan = plans[deposit.plan_id]
+        pd = plan.get_payment_details(deposit=deposit.amount)
+        deposit.update_from_dict({"confirmed": True, "amount_due": pd["due"], **plan.get_date()})
+        # like confirm_deposit, a referral is paid from the first deposit confirmed for the referred account
+        referral_amounts.setdefault(deposit.account_id, pd["referral"])
+    await DepositORM.bulk_update(deposits, fields=["confirmed", "amount_due", "payment_date", "due_date"], using_db=conn)
+    await dashboard_metrics.record_deposits([{"amount": d.amount, "plan_id": d.plan_id} for d in deposits], "pending", "confirmed")
+    await pay_referrals(referral_amounts, using_db=conn)
+
+    users = {user["account_id"]: user for user in await AccountORM.filter(account_id__in=list(referral_amounts)).using_db(conn)
+             .values("account_id", "user__name", "user__email")}
+    entries = []
+    for deposit in deposits:
+        if not (user := users.get(deposit.account_id)):
+            continue
+        email = DepositConfirmationEmail(name=user["user__name"], payment_date=deposit.payment_date, due_date=deposit.due_date,
+                                         plan=deposit.plan_id, amount=deposit.amount, deposit_id=deposit.deposit_id,
+                                         recipients=[user["user__email"]])
+        entries.append(email.outbox_entry())
+    await OutboxORM.bulk_create(entries, using_db=conn)
+    return len(deposits)
+
+
+async def settle_deposit_chunk(ids: list[int], conn) -> int:
+    rows = await locked_rows(DepositORM.filter(deposit_id__in=ids, confirmed=True, settled=False).order_by("deposit_id"),
+                             *SETTLE_FIELDS, using_db=conn)
+    if rows:
+        await settle_rows(rows, using_db=conn)
+    return len(rows)
+
+
+async def complete_withdrawal_chunk(ids: list[int], conn) -> int:
+    rows = await locked_rows(WithdrawalORM.filter(withdrawal_id__in=ids, paid=False).order_by("withdrawal_id"),
+                             "withdrawal_id", "amount", "account_id", using_db=conn)
+    if not rows:
+        return 0
+    changed = await WithdrawalORM.filter(withdrawal_id__in=[row["withdrawal_id"] for row in rows], paid=False).using_db(conn)\
+        .update(paid=True)
+    if changed != len(rows):
+        raise RuntimeError(f"{len(rows) - changed} of {len(rows)} withdrawals were completed concurrently")
+    await dashboard_metrics.record_withdrawals(rows)
+    users = {user["account_id"]: user for user in await AccountORM.filter(account_id__in={row["account_id"] for row in rows})
+             .using_db(conn).values("account_id", "user__name", "user__email")}
+    entries = []
+    for row in rows:
+        if not (user := users.get(row["account_id"])):
+            continue
+        message = f"""We are pleased to inform you that your withdrawal of {row['amount']} has been successful processed."""
+        email = WithdrawalEmail(name=user["user__name"], recipients=[user["user__email"]], title="Withdrawal Completed",
+                                subject="Withdrawal Confirmation", message=message, amount=row["amount"])
+        entries.append(email.outbox_entry())
+    await OutboxORM.bulk_create(entries, using_db=conn)
+    return len(rows)
+
+
+async def confirm_deposits(ids: list[int]) -> BulkReport:
+    return await run_in_chunks(ids, confirm_deposit_chunk)
+
+
+async def settle_selected_deposits(ids: list[int]) -> BulkReport:
+    return await run_in_chunks(ids, settle_deposit_chunk)
+
+
+async def complete_withdrawals(ids: list[int]) -> BulkReport:
+    return await run_in_chunks(ids, complete_withdrawal_chunk)
+
+
 @error_handler(error="Unable to create request")
 async def create_withdrawal(req: Request, wit: WithdrawalCreate) -> ResponseModel:
     async with in_transaction():
         user = req.state.user
         wit = Withdrawal(**wit.dict())
+        if not await debit_account(user.account.account_id, wit.amount, reference=wit.withdrawal_id):
+            return ResponseModel(message="Insufficient balance", status=False)
         await WithdrawalORM.create(**wit.dict(exclude_none=True), account_id=user.account.account_id)
-        await update_account(acc_id=user.account.account_id, amount=wit.amount)
+        await user_cache.invalidate(user.email)
         message = f"""You have requested for a withdrawal of ${wit.amount}
         You will be notified once will process your withdrawal usually between 12 and 24 hours."""
-        email = WithdrawalEmail(name=user.name, recipients=[user.email], message=message)
-        await email.send()
+        email = WithdrawalEmail(name=user.name, recipients=[user.email], message=message, amount=wit.amount)
+        await email.queue()
         return ResponseModel(message=f"Withdrawal request for $f{wit.amount} received")
 
 
 @error_handler(error="Unable to complete withdrawal")
 async def complete_withdrawal(*, wit_id) -> ResponseModel:
-    async with in_transaction():
-        wit = await WithdrawalORM.get(withdrawal_id=wit_id).prefetch_related("account__user")
+    async with in_transaction() as conn:
+        wit = await WithdrawalORM.filter(withdrawal_id=wit_id, paid=False).select_for_update().using_db(conn).first()
+        if wit is None:
+            return ResponseModel(message="Withdrawal not found or already completed", status=False)
+        await wit.fetch_related("account__user", using_db=conn)
         user = wit.account.user
         await wit.update_from_dict({"paid": True})
         await wit.save(update_fields=("paid",))
         message = f"""We are pleased to inform you that your withdrawal of {wit.amount} has been successful processed."""
         email = WithdrawalEmail(name=user.name, recipients=[user.email], title="Withdrawal Completed", subject="Withdrawal Confirmation",
-                                message=message)
-        await email.send()
+                                message=message, amount=wit.amount)
+        await email.queue()
         return ResponseModel(message="Withdrawal completed")
@@ -1,3 +1,6 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from fastapi import HTTPException, Depends, status, Path, Request
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
@@ -9,10 +12,14 @@ from config.env import env
 from models.account import ReferralORM, Referral, Account
 from models.user import UserORM, UserCreate, User, PasswordChange, PasswordReset, ResetPassword
 from utils import now, timedelta, error_handler, ResponseModel, Token
+from utils.cache import user_cache
 from utils.emails import VerificationEmail, PasswordResetEmail
 from .account import create_account
 
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated="auto")
+# bcrypt releases the GIL, so hashing runs on a thread pool and the semaphore caps how many hashes can queue up at once
+hash_executor = ThreadPoolExecutor(max_workers=int(env.HASH_WORKERS or 4), thread_name_prefix="bcrypt")
+hash_slots = asyncio.Semaphore(int(env.HASH_CONCURRENCY or 16))
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
 credentials = HTTPException(
@@ -22,12 +29,14 @@ credentials = HTTPException(
 )
 
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    async with hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, pwd_context.hash, password)
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    async with hash_slots:
+        return await asyncio.get_running_loop().run_in_executor(hash_executor, pwd_context.verify, plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_in: float = 24) -> str:
@@ -48,7 +57,10 @@ def decode_access_token(token, detail: str = "Invalid Token", headers=None):
 async def get_user_from_token(req: Request, token: str = Depends(oauth2_scheme)) -> UserORM:
     try:
         payload = decode_access_token(token, detail="Your session has expires please login again", headers=credentials.headers)
-        user = await UserORM.get(email=payload.get('sub')).prefetch_related('account')
+        email = payload.get('sub')
+        if (user := await user_cache.get(email)) is None:
+            user = await UserORM.get(email=email).prefetch_related('account')
+            await user_cache.set(email, user)
         req.state.user = user
         return user
     except DoesNotExist:
@@ -57,7 +69,7 @@ async def get_user_from_token(req: Request, token: str = Depends(oauth2_scheme))
 
 async def authenticate_user(login: OAuth2PasswordRequestForm = Depends()) -> Token:
     user = await UserORM.get(email=login.username)
-    if not verify_password(login.password, user.password_hash):
+    if not await verify_password(login.password, user.password_hash):
         raise credentials
 
     await user.save(update_fields=('last_login',))
@@ -75,7 +87,7 @@ async def create_referral(*, referrer_id: str, referred_id: int):
 @error_handler(error="Unable to create your account at this time. Try again")
 async def create_user(user_create: UserCreate, req: Request) -> ResponseModel:
     async with in_transaction():
-        pwd_hash = hash_password(user_create.password)
+        pwd_hash = await hash_password(user_create.password)
         user = User(**user_create.dict())
         user = await UserORM.create(**user.dict(), password_hash=pwd_hash)
         await create_account(Account(user_id=user.user_id))
@@ -83,7 +95,7 @@ async def create_user(user_create: UserCreate, req: Request) -> ResponseModel:
         token = create_access_token({'sub': user.email, 'client': req.client.host}, expires_in=2)
         link = f'{req.base_url}auth/verify/{token}'
         email = VerificationEmail(name=user.name, link=link, recipients=[user.email])
-        res = await email.send()
+        res = await email.queue()
         message = f"{message} A verification link has been sent to your email." if res else f"{message} Unable to verify your email."
 
         if user_create.referrer_id:
@@ -94,14 +106,15 @@ async def create_user(user_create: UserCreate, req: Request) -> ResponseModel:
 
 @error_handler(error="Unable to change your password")
 async def password_change(password_data: PasswordChange, user: UserORM = Depends(get_user_from_token)) -> ResponseModel:
-    if not (verify_password(password_data.old_password, user.password_hash) and password_data.password == password_data.password_confirm):
+    if not (await verify_password(password_data.old_password, user.password_hash) and password_data.password == password_data.password_confirm):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect password"
         )
-    password_hash = hash_password(password_data.password)
+    password_hash = await hash_password(password_data.password)
     user = await user.update_from_dict({'password_hash': password_hash})
     await user.save(update_fields=('password_hash',))
+    await user_cache.invalidate(user.email)
     return ResponseModel(message="Password Change Successful")
 
 
@@ -112,6 +125,7 @@ async def verify_account(token: str = Path(...), ):
     user = await UserORM.get(email=payload.get('sub'))
     await user.update_from_dict({"verified": True})
     await user.save(update_fields=('verified',))
+    await user_cache.invalidate(user.email)
     return client
 
 
@@ -120,7 +134,7 @@ async def verify_user(req: Request, user: UserORM = Depends(get_user_from_token)
     token = create_access_token(data={"client": req.client.host, "sub": user.email}, expires_in=2)
     link = f"{req.base_url}/auth/verify/{token}"
     email = VerificationEmail(name=user.name, link=link, recipients=[user.email])
-    res = await email.send()
+    res = await email.queue()
     if res:
         return ResponseModel(message="A verification link has been sent to your email address")
     return ResponseModel(message="Unable to verify your email address")
@@ -135,7 +149,7 @@ async def reset_password(data: ResetPassword, req: Request) -> ResponseModel:
     token = create_access_token({'sub': email}, expires_in=2)
     link = f"https://{req.client.host}/user/resetpassword/{token}"
     email = PasswordResetEmail(name=user.name, link=link, recipients=[user.email])
-    res = await email.send()
+    res = await email.queue()
     message = "A password reset link, that will expire in two hours has been sent to your email address" if res else "Unable to send password reset " \
                                                                                                                      "link verify your email address"
     return ResponseModel(message=message)
@@ -147,6 +161,7 @@ async def password_reset(data: PasswordReset) -> ResponseModel:
     user = await UserORM.get_or_none(email=payload.get('sub'))
     if not user:
         return ResponseModel(message="No user with that email was found")
-    await user.update_from_dict({"password_hash": hash_password(data.password)})
+    await user.update_from_dict({"password_hash": await hash_password(data.password)})
     await user.save(update_fields=('password_hash',))
+    await user_cache.invalidate(user.email)
     return ResponseModel(message="Password Reset Successful")
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+from collections import defaultdict
+from time import perf_counter
+from typing import Iterable, Optional
+
+from tortoise import connections
+from tortoise.exceptions import OperationalError
+from tortoise.transactions import in_transaction
+
+from config.env import env
+from models.account import AccountORM, LedgerKind, LedgerORM
+from utils import locked_rows
+from .metrics import dashboard_metrics
+
+logger = logging.getLogger(__name__)
+
+LEDGER_COMPACTION_CHUNK = int(env.LEDGER_COMPACTION_CHUNK or 1000)
+# mysql deadlock and lock wait timeout
+LOCK_CONFLICT_CODES = (1213, 1205)
+
+
+async def post_entries(entries: list[LedgerORM], using_db=None):
+    """Append balance changes to the ledger.
+
+    Writers only insert, so concurrent credits to the same account never wait on each other for the Accounts row. The
+    entries count towards the balance as soon as they commit and are folded into Accounts.balance later by `compact_ledger`.
+    """
+    if not entries:
+        return
+    await LedgerORM.bulk_create(entries, using_db=using_db)
+    await dashboard_metrics.record_balance(sum(entry.amount for entry in entries))
+
+
+async def get_balances(account_ids: Iterable[int], using_db=None) -> dict[int, float]:
+    """Current balances, the checkpoint on Accounts plus the entries not checkpointed yet, read in one statement."""
+    account_ids = list(account_ids)
+    if not account_ids:
+        return {}
+    conn = using_db or connections.get(AccountORM._meta.default_connection)
+    accounts, ledger = AccountORM._meta.db_table, LedgerORM._meta.db_table
+    ids = ", ".join("%s" for _ in account_ids)
+    sql = f"SELECT a.`account_id`, a.`balance` + COALESCE(SUM(l.`amount`), 0) AS `balance` FROM `{accounts}` a " \
+          f"LEFT JOIN `{ledger}` l ON l.`account_id` = a.`account_id` AND l.`checkpointed` = 0 " \
+          f"WHERE a.`account_id` IN ({ids}) GROUP BY a.`account_id`, a.`balance`"
+    rows = await conn.execute_query_dict(sql, account_ids)
+    return {row["account_id"]: row["balance"] for row in rows}
+
+
+async def get_balance(account_id: int, using_db=None) -> float:
+    return (await get_balances([account_id], using_db=using_db)).get(account_id, 0)
+
+
+async def accounts_with_balance(low: float, high: Optional[float] = None, using_db=None) -> list[int]:
+    """Accounts whose current balance is at least low, and at most high when given."""
+    conn = using_db or connections.get(AccountORM._meta.default_connection)
+    accounts, ledger = AccountORM._meta.db_table, LedgerORM._meta.db_table
+    having, values = "`current` >= %s", [low]
+    if high is not None:
+        having, values = "`current` BETWEEN %s AND %s", [low, high]
+    sql = f"SELECT a.`account_id`, a.`balance` + COALESCE(SUM(l.`amount`), 0) AS `current` FROM `{accounts}` a " \
+          f"LEFT JOIN `{ledger}` l ON l.`account_id` = a.`account_id` AND l.`checkpointed` = 0 " \
+          f"GROUP BY a.`account_id`, a.`balance` HAVING {having}"
+    return [row["account_id"] for row in await conn.execute_query_dict(sql, values)]
+
+
+async def debit_account(account_id: int, amount: float, *, kind: LedgerKind = LedgerKind.withdrawal, reference: Optional[int] = None,
+                        using_db=None) -> bool:
+    """Take amount off an account if its current balance covers it, returns False when it does not.
+
+    The Accounts row is locked first, the order compact_ledger takes its locks in as well, and the debit is a conditional
+    UPDATE of the locked checkpoint, so concurrent debits of the same account queue on the row and cannot overdraw it. The
+    ledger tail is a plain consistent read, which leaves credits to the account free to insert meanwhile. Compaction can't
+    fold the account while the lock is held, but the read must see every fold committed before it was taken, so call this
+    before any other read of its transaction, as create_withdrawal does.
+    The debit is also appended to the ledger, already checkpointed, as the record of the withdrawal.
+    """
+    if amount <= 0:
+        raise ValueError("Debit amount must be positive")
+    conn = using_db or connections.get(AccountORM._meta.default_connection)
+    accounts, ledger = AccountORM._meta.db_table, LedgerORM._meta.db_table
+    locked = await conn.execute_query_dict(f"SELECT `account_id` FROM `{accounts}` WHERE `account_id` = %s FOR UPDATE", [account_id])
+    if not locked:
+        return False
+    tail = await conn.execute_query_dict(f"SELECT COALESCE(SUM(`amount`), 0) AS `tail` FROM `{ledger}` "
+                                         f"WHERE `account_id` = %s AND `checkpointed` = 0", [account_id])
+    sql = f"UPDATE `{accounts}` SET `balance` = `balance` - %s WHERE `account_id` = %s AND `balance` + %s >= %s"
+    affected, _ = await conn.execute_query(sql, [amount, account_id, tail[0]["tail"], amount])
+    if not affected:
+        return False
+    await post_entries([LedgerORM(account_id=account_id, amount=-amount, kind=kind, reference=reference, checkpointed=True)],
+                       using_db=using_db)
+    return True
+
+
+async def add_to_checkpoints(totals: dict[int, float], using_db=None):
+    """Add to many Accounts.balance checkpoints with a single set-based UPDATE, one CASE branch per account."""
+    if not totals:
+        return
+    conn = using_db or connections.get(AccountORM._meta.default_connection)
+    cases = " ".join("WHEN %s THEN %s" for _ in totals)
+    ids = ", ".join("%s" for _ in totals)
+    table = AccountORM._meta.db_table
+    sql = f"UPDATE `{table}` SET `balance` = `balance` + CASE `account_id` {cases} END WHERE `account_id` IN ({ids})"
+    values = [value for item in totals.items() for value in item] + list(totals)
+    await conn.execute_query(sql, values)
+
+
+def is_lock_conflict(err: Exception) -> bool:
+    """Deadlock or lock wait timeout, the statement is safe to retry in a new transaction."""
+    original = err.args[0] if err.args else None
+    return getattr(original, "args", (None,))[0] in LOCK_CONFLICT_CODES
+
+
+async def compact_chunk(chunk_size: int) -> tuple[int, int]:
+    """Fold one chunk, returns the number of entries seen and folded."""
+    async with in_transaction() as conn:
+        candidates = await LedgerORM.filter(checkpointed=False).order_by("entry_id").limit(chunk_size).using_db(conn)\
+            .values("entry_id", "account_id")
+        if not candidates:
+            return 0, 0
+        # Accounts rows first, like debit_account, accounts being debited or folded by another worker are left for the next run
+        accounts = await locked_rows(AccountORM.filter(account_id__in={entry["account_id"] for entry in candidates}).order_by("account_id"),
+                                     "account_id", skip_locked=True, using_db=conn)
+        account_ids = {account["account_id"] for account in accounts}
+        ids = [entry["entry_id"] for entry in candidates if entry["account_id"] in account_ids]
+        if not ids:
+            return len(candidates), 0
+        # locked by primary key so only these rows are locked, no gaps, and read again as the locked rows now stand
+        entries = await locked_rows(LedgerORM.filter(entry_id__in=ids, checkpointed=False).order_by("entry_id"),
+                                    "entry_id", "account_id", "amount", using_db=conn)
+        if not entries:
+            return len(candidates), 0
+        # flipped before summing, only entries this run took out of the tail are added to the checkpoints
+        changed = await LedgerORM.filter(entry_id__in=[entry["entry_id"] for entry in entries], checkpointed=False).using_db(conn)\
+            .update(checkpointed=True)
+        if changed != len(entries):
+            raise RuntimeError(f"{len(entries) - changed} of {len(entries)} ledger entries were folded concurrently")
+        totals = defaultdict(float)
+        for entry in entries:
+            totals[entry["account_id"]] += entry["amount"]
+        await add_to_checkpoints(totals, using_db=conn)
+        return len(candidates), len(entries)
+
+
+async def compact_ledger(*, chunk_size: int = LEDGER_COMPACTION_CHUNK, retries: int = 3) -> int:
+    """Fold ledger entries into the Accounts checkpoints, returns the number of entries folded.
+
+    Each chunk adds the entries to their accounts and flags them checkpointed in one transaction, so a balance read sees
+    either the entries or the checkpoint holding them, never both. A chunk that hits a deadlock or a lock wait timeout is
+    retried. Entries of accounts locked by a withdrawal, or by another worker compacting at the same time, are picked up by
+    the next run.
+    """
+    folded = 0
+    attempts = 0
+    start = perf_counter()
+    while True:
+        try:
+            seen, count = await compact_chunk(chunk_size)
+        except OperationalError as err:
+            if not is_lock_conflict(err) or attempts >= retries:
+                logger.exception("Ledger compaction failed after folding %s entries: %s", folded, err)
+                break
+            attempts += 1
+            await asyncio.sleep(0.1 * attempts)
+            continue
+        except Exception as err:
+            logger.exception("Ledger compaction failed after folding %s entries: %s", folded, err)
+            break
+        attempts = 0
+        folded += count
+        if seen < chunk_size or not count:
+            break
+    if folded:
+        logger.info("Folded %s ledger entries into checkpoints in %.2fs", folded, perf_counter() - start)
+    return folded
@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime
+from typing import Optional
+
+from tortoise import signals
+from tortoise.timezone import make_aware, is_naive
+
+from config.env import env
+from models.account import DepositORM
+from utils import now
+from .account import settle_deposits
+
+logger = logging.getLogger(__name__)
+
+
+class MaturityScheduler:
+    """Settles confirmed deposits shortly after they mature.
+
+    Confirmed, unsettled deposits are kept in an in-memory heap keyed by due date. The heap is rebuilt from the database on
+    start and by `rebuild` afterwards, which also picks up deposits confirmed by other workers. Every worker runs a scheduler
+    over the same deposits, so settlement goes through `settle_deposits`, which locks the deposits of a chunk and settles only
+    those still unsettled. A worker that reaches a deposit after another one waits on the lock and then skips it.
+    """
+
+    def __init__(self, *, batch_size: int = 100, poll_interval: float = 60, grace: float = 1):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.grace = grace
+        self.index: list[tuple[datetime, int]] = []
+        self.scheduled: set[int] = set()
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def add(self, deposit_id: int, due_date: datetime):
+        if deposit_id in self.scheduled:
+            return
+        due_date = make_aware(due_date) if is_naive(due_date) else due_date
+        heapq.heappush(self.index, (due_date, deposit_id))
+        self.scheduled.add(deposit_id)
+        self.wakeup.set()
+
+    async def schedule(self, deposit_ids: list[int]):
+        """Add deposits confirmed by a set-based write, which sends no post_save signal, once it has committed"""
+        if not deposit_ids:
+            return
+        rows = await DepositORM.filter(deposit_id__in=deposit_ids, confirmed=True, settled=False, due_date__isnull=False)\
+            .values_list("deposit_id", "due_date")
+        for deposit_id, due_date in rows:
+            self.add(deposit_id, due_date)
+
+    async def rebuild(self):
+        rows = await DepositORM.filter(confirmed=True, settled=False, due_date__isnull=False).values_list("deposit_id", "due_date")
+        self.index.clear()
+        self.scheduled.clear()
+        for deposit_id, due_date in rows:
+            self.add(deposit_id, due_date)
+        logger.info("Maturity index rebuilt with %s deposits", len(self.index))
+
+    def pop_due(self) -> list[int]:
+        cutoff = now()
+        ids = []
+        while self.index and self.index[0][0] <= cutoff and len(ids) < self.batch_size:
+            _, deposit_id = heapq.heappop(self.index)
+            self.scheduled.discard(deposit_id)
+            ids.append(deposit_id)
+        return ids
+
+    async def wait(self):
+        self.wakeup.clear()
+        timeout = self.poll_interval
+        if self.index:
+            timeout = min(timeout, max((self.index[0][0] - now()).total_seconds(), 0) + self.grace)
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        await self.rebuild()
+        while True:
+            try:
+                if ids := self.pop_due():
+                    await settle_deposits(deposit_ids=ids, chunk_size=self.batch_size)
+                    continue
+                await self.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.exception("Maturity scheduler iteration failed: %s", err)
+                await asyncio.sleep(self.poll_interval)
+
+    async def on_deposit_saved(self, sender, instance: DepositORM, created: bool, using_db, update_fields):
+        if instance.confirmed and not instance.settled and instance.due_date:
+            self.add(instance.deposit_id, instance.due_date)
+
+    def start(self):
+        signals.post_save(DepositORM)(self.on_deposit_saved)
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+maturity_scheduler = MaturityScheduler(batch_size=int(env.MATURITY_BATCH_SIZE or 100), poll_interval=float(env.MATURITY_POLL_INTERVAL or 60))
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from aioredis import Redis
+from tortoise import connections, signals
+from tortoise.functions import Count, Sum
+
+from config.env import env
+from models.account import AccountORM, DepositORM, LedgerORM, WithdrawalORM
+from models.user import UserORM
+from utils import now
+
+logger = logging.getLogger(__name__)
+
+DEPOSIT_STATES = ("pending", "confirmed", "settled")
+DEPOSIT_FIELDS = ("amount", "plan_id", "confirmed", "settled")
+WITHDRAWAL_FIELDS = ("amount", "paid")
+
+
+def deposit_state(row) -> str:
+    if row["settled"]:
+        return "settled"
+    return "confirmed" if row["confirmed"] else "pending"
+
+
+def deposit_metrics(row, state: Optional[str] = None, sign: int = 1) -> dict[str, float]:
+    prefix = f"deposits:{state or deposit_state(row)}:{row['plan_id'] or 'none'}"
+    return {f"{prefix}:amount": sign * (row["amount"] or 0), f"{prefix}:count": sign}
+
+
+def withdrawal_metrics(row, sign: int = 1) -> dict[str, float]:
+    if row["paid"]:
+        return {}
+    return {"withdrawals:unpaid:amount": sign * (row["amount"] or 0), "withdrawals:unpaid:count": sign}
+
+
+def merge(*deltas: dict[str, float]) -> dict[str, float]:
+    ret = defaultdict(float)
+    for delta in deltas:
+        for field, value in delta.items():
+            ret[field] += value
+    return {field: value for field, value in ret.items() if value}
+
+
+class DashboardMetrics:
+    """Running totals for the admin dashboard, kept in a Redis hash so reading them costs the same at any table size.
+
+    Saves and deletes of deposits, withdrawals, accounts and users adjust the totals through Tortoise signals. Set-based
+    writes (queryset updates, bulk_update, raw SQL) send no signals, so those paths call `record_deposits`, `record_withdrawals`
+    and `record_balance` themselves. Increments are applied when the write happens, not when its transaction commits, so a
+    rollback or a write made outside these paths leaves the totals off until `recompute` rebuilds them from the database.
+    """
+
+    key = "dashboard:metrics"
+    signups_key = "dashboard:signups"
+
+    def __init__(self, *, signup_days: int = 30):
+        self.signup_days = signup_days
+        self.redis: Optional[Redis] = None
+        self.task: Optional[asyncio.Task] = None
+
+    async def record(self, delta: dict[str, float]):
+        if not self.redis or not (delta := merge(delta)):
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for field, value in delta.items():
+                    pipe.hincrbyfloat(self.key, field, value)
+                await pipe.execute()
+        except Exception as err:
+            logger.warning("Unable to record dashboard metrics: %s", err)
+
+    async def record_balance(self, amount: float):
+        await self.record({"balance:total": amount})
+
+    async def record_deposits(self, rows: Iterable, old_state: str, new_state: str):
+        """Move deposits between states, rows need amount and plan_id."""
+        await self.record(merge(*(merge(deposit_metrics(row, old_state, -1), deposit_metrics(row, new_state)) for row in rows)))
+
+    async def record_withdrawals(self, rows: Iterable):
+        """Drop paid withdrawals from the unpaid totals, rows need amount."""
+        await self.record(merge(*(withdrawal_metrics({"amount": row["amount"], "paid": False}, -1) for row in rows)))
+
+    async def before_save(self, sender, instance, using_db, update_fields):
+        fields = DEPOSIT_FIELDS if sender is DepositORM else WITHDRAWAL_FIELDS
+        instance._metrics_before = {}
+        if not instance._saved_in_db or (update_fields and not set(update_fields) & set(fields)):
+            return
+        # the saved row is what the totals currently count, the instance may already be changed
+        row = await sender.filter(pk=instance.pk).using_db(using_db).first().values(*fields)
+        if row:
+            instance._metrics_before = deposit_metrics(row) if sender is DepositORM else withdrawal_metrics(row)
+
+    async def after_save(self, sender, instance, created: bool, using_db, update_fields):
+        fields = DEPOSIT_FIELDS if sender is DepositORM else WITHDRAWAL_FIELDS
+        if not created and update_fields and not set(update_fields) & set(fields):
+            return
+        row = {field: getattr(instance, field) for field in fields}
+        after = deposit_metrics(row) if sender is DepositORM else withdrawal_metrics(row)
+        before = getattr(instance, "_metrics_before", {})
+        await self.record(merge(after, {field: -value for field, value in before.items()}))
+
+    async def after_delete(self, sender, instance, using_db):
+        if sender is AccountORM:
+            await self.record_balance(-instance.balance)
+            return
+        fields = DEPOSIT_FIELDS if sender is DepositORM else WITHDRAWAL_FIELDS
+        row = {field: getattr(instance, field) for field in fields}
+        await self.record(deposit_metrics(row, sign=-1) if sender is DepositORM else withdrawal_metrics(row, -1))
+
+    async def on_account_saved(self, sender, instance: AccountORM, created: bool, using_db, update_fields):
+        # later balance changes go through the ledger, which records them
+        if created and isinstance(instance.balance, (int, float)):
+            await self.record_balance(instance.balance)
+
+    async def on_user_saved(self, sender, instance: UserORM, created: bool, using_db, update_fields):
+        if created and self.redis and instance.created:
+            try:
+                await self.redis.hincrby(self.signups_key, instance.created.date().isoformat(), 1)
+            except Exception as err:
+                logger.warning("Unable to record signup: %s", err)
+
+    async def recompute(self):
+        """Rebuild every total from the database, correcting whatever drift the incremental updates picked up."""
+        if not self.redis:
+            return
+        cutoff = (now() - timedelta(days=self.signup_days)).date()
+        conn = connections.get(UserORM._meta.default_connection)
+        balance, deposits, withdrawals, signups = await asyncio.gather(
+            conn.execute_query_dict(f"SELECT (SELECT COALESCE(SUM(`balance`), 0) FROM `{AccountORM._meta.db_table}`) + "
+                                    f"(SELECT COALESCE(SUM(`amount`), 0) FROM `{LedgerORM._meta.db_table}` WHERE `checkpointed` = 0) AS `total`"),
+            DepositORM.all().annotate(amount_sum=Sum("amount"), rows=Count("deposit_id"))
+            .group_by("plan_id", "confirmed", "settled").values("plan_id", "confirmed", "settled", "amount_sum", "rows"),
+            WithdrawalORM.filter(paid=False).annotate(amount_sum=Sum("amount"), rows=Count("withdrawal_id"))
+            .group_by("paid").values("amount_sum", "rows"),
+            conn.execute_query_dict(f"SELECT DATE(`created`) AS `day`, COUNT(*) AS `signups` FROM `{UserORM._meta.db_table}` "
+                                    f"WHERE `created` >= %s GROUP BY `day`", [cutoff]),
+        )
+        metrics = {"balance:total": balance[0]["total"] if balance else 0, "withdrawals:unpaid:amount": 0, "withdrawals:unpaid:count": 0}
+        for row in deposits:
+            prefix = f"deposits:{deposit_state(row)}:{row['plan_id'] or 'none'}"
+            metrics[f"{prefix}:amount"] = metrics.get(f"{prefix}:amount", 0) + (row["amount_sum"] or 0)
+            metrics[f"{prefix}:count"] = metrics.get(f"{prefix}:count", 0) + row["rows"]
+        for row in withdrawals:
+            metrics["withdrawals:unpaid:amount"] = row["amount_sum"] or 0
+            metrics["withdrawals:unpaid:count"] = row["rows"]
+        metrics["refreshed"] = now().isoformat()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self.key, self.signups_key)
+            pipe.hset(self.key, mapping=metrics)
+            if signups:
+                pipe.hset(self.signups_key, mapping={str(row["day"]): row["signups"] for row in signups})
+            await pipe.execute()
+        logger.info("Dashboard metrics recomputed")
+
+    async def snapshot(self, days: int = 14) -> dict:
+        """The current totals, grouped for the dashboard."""
+        if not self.redis:
+            return {}
+        values, signups = await asyncio.gather(self.redis.hgetall(self.key), self.redis.hgetall(self.signups_key))
+        deposits = defaultdict(lambda: {state: {"amount": 0.0, "count": 0} for state in DEPOSIT_STATES})
+        for field, value in values.items():
+            kind, *parts = field.split(":")
+            if kind == "deposits":
+                state, plan, measure = parts
+                deposits[plan][state][measure] = float(value) if measure == "amount" else int(float(value))
+        first_day = (now() - timedelta(days=days - 1)).date()
+        days = [(first_day + timedelta(days=i)).isoformat() for i in range(days)]
+        return {
+            "balance": float(values.get("balance:total", 0)),
+            "deposits": dict(sorted(deposits.items())),
+            "withdrawals": {"amount": float(values.get("withdrawals:unpaid:amount", 0)),
+                            "count": int(float(values.get("withdrawals:unpaid:count", 0)))},
+            "signups": [(day, int(signups.get(day, 0))) for day in days],
+            "refreshed": values.get("refreshed"),
+        }
+
+    def start(self, redis: Redis):
+        self.redis = redis
+        signals.pre_save(DepositORM, WithdrawalORM)(self.before_save)
+        signals.post_save(DepositORM, WithdrawalORM)(self.after_save)
+        signals.post_delete(DepositORM, WithdrawalORM, AccountORM)(self.after_delete)
+        signals.post_save(AccountORM)(self.on_account_saved)
+        signals.post_save(UserORM)(self.on_user_saved)
+        self.task = asyncio.create_task(self.refresh())
+
+    async def refresh(self):
+        try:
+            await self.recompute()
+        except Exception as err:
+            logger.exception("Dashboard metrics recompute failed: %s", err)
+
+
+dashboard_metrics = DashboardMetrics(signup_days=int(env.METRICS_SIGNUP_DAYS or 30))
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from typing import Optional
+
+from tortoise.transactions import in_transaction
+
+from config.env import env
+from models.outbox import OutboxORM, OutboxStatus
+from utils import now, timedelta
+from utils.emails import Email
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """Drains the email outbox in the background.
+
+    Entries are claimed in batches by moving them to `sending` with a lease, so an entry claimed by a worker that dies is
+    picked up again once the lease expires. Failed deliveries are retried with exponential backoff until max_attempts.
+    """
+
+    def __init__(self, *, concurrency: int = 10, batch_size: int = 100, poll_interval: float = 1, max_attempts: int = 5,
+                 backoff: float = 30, lease: float = 300):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.task: Optional[asyncio.Task] = None
+
+    async def depth(self) -> int:
+        return await OutboxORM.filter(status__in=(OutboxStatus.pending, OutboxStatus.sending)).count()
+
+    async def claim(self) -> list[OutboxORM]:
+        async with in_transaction() as conn:
+            entries = await OutboxORM.filter(status__in=(OutboxStatus.pending, OutboxStatus.sending), next_attempt__lte=now())\
+                .order_by("outbox_id").limit(self.batch_size).select_for_update().using_db(conn)
+            if entries:
+                await OutboxORM.filter(outbox_id__in=[entry.outbox_id for entry in entries]).using_db(conn)\
+                    .update(status=OutboxStatus.sending, next_attempt=now() + timedelta(seconds=self.lease))
+        return entries
+
+    async def deliver(self, entry: OutboxORM):
+        async with self.semaphore:
+            attempts = entry.attempts + 1
+            try:
+                await Email.from_outbox(entry).deliver()
+            except Exception as err:
+                if attempts >= self.max_attempts:
+                    status, next_attempt = OutboxStatus.failed, None
+                    logger.error("Giving up on outbox entry %s after %s attempts: %s", entry.outbox_id, attempts, err)
+                else:
+                    status, next_attempt = OutboxStatus.pending, now() + timedelta(seconds=self.backoff * 2 ** (attempts - 1))
+                await OutboxORM.filter(outbox_id=entry.outbox_id)\
+                    .update(status=status, attempts=attempts, next_attempt=next_attempt, last_error=str(err))
+                return
+            await OutboxORM.filter(outbox_id=entry.outbox_id).update(status=OutboxStatus.sent, attempts=attempts, next_attempt=None)
+
+    async def run(self):
+        while True:
+            try:
+                if entries := await self.claim():
+                    await asyncio.gather(*(self.deliver(entry) for entry in entries))
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                logger.exception("Outbox dispatch failed: %s", err)
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+outbox_dispatcher = OutboxDispatcher(concurrency=int(env.OUTBOX_CONCURRENCY or 10), batch_size=int(env.OUTBOX_BATCH_SIZE or 100),
+                                     poll_interval=float(env.OUTBOX_POLL_INTERVAL or 1), max_attempts=int(env.OUTBOX_MAX_ATTEMPTS or 5),
+                                     backoff=float(env.OUTBOX_BACKOFF or 30))
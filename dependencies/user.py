@@ -1,38 +1,92 @@
-from fastapi import HTTPException, Depends, status
+import asyncio
+from typing import Optional
 
-from models.account import (DepositView, ReferralView, AccountView, WithdrawalView, AccountORM, Account)
+from fastapi import HTTPException, Depends, Query, status
+from tortoise.expressions import Q
+from tortoise.queryset import QuerySet
+
+from models.account import (DepositView, ReferralView, AccountView, WithdrawalView, DepositORM, WithdrawalORM, ReferralORM,
+                            DepositPage, WithdrawalPage)
 from models.user import UserORM, UserView, User, UserEdit
-from utils import error_handler, ResponseModel
+from fastapi_admin.utils import encode_cursor, decode_cursor
+from utils import error_handler, ResponseModel, datetime
+from utils.cache import user_cache
 from .auth import get_user_from_token
+from .ledger import get_balance
 
 
 # ToDo: Add logging for direct path operation functions, and dependencies
 
 
-# TODO: get full dashboard of all user details and transactions
-async def get_current_user(user: UserORM = Depends(get_user_from_token)) -> UserView:
+def view_rows(rows: list[dict]) -> list[dict]:
+    return [{key: value for key, value in row.items() if value is not None} for row in rows]
+
+
+async def no_rows() -> None:
+    return None
+
+
+async def get_current_user(user: UserORM = Depends(get_user_from_token), history: bool = True) -> UserView:
+    """Load the dashboard in at most four concurrent queries, selecting only the columns the views need.
+
+    The views are built with `construct`, the response model validates the payload once on the way out. With history off the
+    deposit and withdrawal lists are left out, clients page through them with the /deposits and /withdrawals endpoints.
+    """
     try:
-        await user.fetch_related('account', 'referrals')
-        account: AccountORM = user.account
-        acc = Account.from_orm(account)
-        await account.fetch_related('deposits', 'withdrawals')
-        deposits = [DepositView.from_orm(deposit) for deposit in account.deposits]
-        withdrawals = [WithdrawalView.from_orm(wit) for wit in account.withdrawals]
-        referrals = [ReferralView.from_orm(ref) for ref in user.referrals]
-        account_details = AccountView(deposits=deposits, withdrawals=withdrawals, **acc.dict())
-        user_ = User.from_orm(user)
-        user_view = UserView(**user_.dict())
-        user_view.account_details = account_details
-        user_view.referrals = referrals
-        return user_view
+        account_id = user.account.account_id
+        balance, deposits, withdrawals, referrals = await asyncio.gather(
+            get_balance(account_id),
+            DepositORM.filter(account_id=account_id).values(*DepositView.__fields__) if history else no_rows(),
+            WithdrawalORM.filter(account_id=account_id).values(*WithdrawalView.__fields__) if history else no_rows(),
+            ReferralORM.filter(referrer_id=user.user_id).values(*ReferralView.__fields__),
+        )
+        account_details = AccountView.construct(
+            balance=balance,
+            deposits=[DepositView.construct(**row) for row in view_rows(deposits)] if history else None,
+            withdrawals=[WithdrawalView.construct(**row) for row in view_rows(withdrawals)] if history else None,
+        )
+        fields = {name: getattr(user, name) for name in User.__fields__ if getattr(user, name, None) is not None}
+        return UserView.construct(**fields, account_details=account_details,
+                                  referrals=[ReferralView.construct(**row) for row in view_rows(referrals)])
     except Exception as err:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Something Went Wrong")
 
 
+async def keyset_page(qs: QuerySet, date_field: str, id_field: str, fields: list[str], cursor: Optional[str], limit: int):
+    """Page newest first on (date_field, id_field), which is backed by an (account_id, date, id) index"""
+    qs = qs.filter(**{f"{date_field}__isnull": False})
+    if cursor:
+        try:
+            date, pk = decode_cursor(cursor)
+            date, pk = datetime.fromisoformat(date), int(pk)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        qs = qs.filter(Q(**{f"{date_field}__lt": date}) | Q(**{date_field: date, f"{id_field}__lt": pk}))
+    rows = await qs.order_by(f"-{date_field}", f"-{id_field}").limit(limit + 1).values(id_field, *fields)
+    next_cursor = encode_cursor([rows[limit - 1][date_field], rows[limit - 1][id_field]]) if len(rows) > limit else None
+    return view_rows(rows[:limit]), next_cursor
+
+
+async def get_deposits(user: UserORM = Depends(get_user_from_token), cursor: Optional[str] = None,
+                       limit: int = Query(20, ge=1, le=100)) -> DepositPage:
+    rows, next_cursor = await keyset_page(DepositORM.filter(account_id=user.account.account_id), "payment_date", "deposit_id",
+                                          list(DepositView.__fields__), cursor, limit)
+    return DepositPage.construct(items=[DepositView.construct(**row) for row in rows], next_cursor=next_cursor)
+
+
+async def get_withdrawals(user: UserORM = Depends(get_user_from_token), cursor: Optional[str] = None,
+                          limit: int = Query(20, ge=1, le=100)) -> WithdrawalPage:
+    rows, next_cursor = await keyset_page(WithdrawalORM.filter(account_id=user.account.account_id), "withdrawal_date", "withdrawal_id",
+                                          list(WithdrawalView.__fields__), cursor, limit)
+    return WithdrawalPage.construct(items=[WithdrawalView.construct(**row) for row in rows], next_cursor=next_cursor)
+
+
 @error_handler(error="Unable to update user account")
 async def update_user(update: UserEdit, user: UserORM = Depends(get_user_from_token)) -> ResponseModel:
+    email = user.email
     await user.update_from_dict(**update.dict(exclude_unset=True))
     updates = tuple(update.dict(exclude_unset=True).keys())
     await user.save(update_fields=updates)
+    await user_cache.invalidate(email, user.email)
     return ResponseModel(message="User update successful")
 
@@ -3,17 +3,18 @@ from typing import Dict, List, Optional, Type
 from aioredis import Redis
 from fastapi import FastAPI
 from pydantic import HttpUrl
-from starlette.middleware.base import BaseHTTPMiddleware
-from tortoise import Model
+from tortoise import Model, Tortoise
 
 from fastapi_admin import i18n
 
 from . import middlewares, template
+from .depends import build_sidebar
 from .providers import Provider
 from .resources import Dropdown
 from .resources import Model as ModelResource
 from .resources import Resource
 from .routes import router
+from .widgets.filters import DistinctColumn
 
 
 class FastAPIAdmin(FastAPI):
@@ -22,6 +23,11 @@ class FastAPIAdmin(FastAPI):
     admin_path: str
     resources: List[Type[Resource]] = []
     model_resources: Dict[Type[Model], Type[Resource]] = {}
+    # resource slug (lowercase model name) to model, resolved from the registered resources first and then from Tortoise
+    model_slugs: Dict[str, Type[Model]] = {}
+    tortoise_models_indexed: bool = False
+    sidebar: Optional[List[dict]] = None
+    template_stats: Optional[dict] = None
     redis: Redis
     language_switch: bool = True
     favicon_url: Optional[HttpUrl] = None
@@ -36,15 +42,26 @@ class FastAPIAdmin(FastAPI):
         template_folders: Optional[List[str]] = None,
         providers: Optional[List[Provider]] = None,
         favicon_url: Optional[HttpUrl] = None,
+        template_cache_dir: Optional[str] = None,
+        precompile_templates: bool = False,
     ):
         self.redis = redis
-        i18n.set_locale(default_locale)
+        # the distinct value cache is shared by every worker, so each one invalidates it from its first write
+        DistinctColumn.redis = redis
+        i18n.set_default_locale(default_locale)
         self.admin_path = admin_path
         self.language_switch = language_switch
         self.logo_url = logo_url
         self.favicon_url = favicon_url
         if template_folders:
             template.add_template_folder(*template_folders)
+        if template_cache_dir:
+            template.set_bytecode_cache(template_cache_dir)
+        if precompile_templates:
+            self.template_stats = template.precompile()
+        for resource in set(self.model_resources.values()):
+            resource.prepare()
+        self._index_tortoise_models()
         await self._register_providers(providers)
 
     async def _register_providers(self, providers: Optional[List[Provider]] = None):
@@ -58,13 +75,33 @@ class FastAPIAdmin(FastAPI):
     def _set_model_resource(self, resource: Type[Resource]):
         if issubclass(resource, ModelResource):
             self.model_resources[resource.model] = resource
+            self.model_slugs[resource.model.__name__.lower()] = resource.model
         elif issubclass(resource, Dropdown):
             for r in resource.resources:
                 self._set_model_resource(r)
 
+    def _index_tortoise_models(self):
+        for models in Tortoise.apps.values():
+            for name, model in models.items():
+                self.model_slugs.setdefault(name.lower(), model)
+        self.tortoise_models_indexed = bool(Tortoise.apps)
+
     def register(self, resource: Type[Resource]):
         self._set_model_resource(resource)
         self.resources.append(resource)
+        self.sidebar = None
+
+    def get_model(self, slug: str) -> Optional[Type[Model]]:
+        model = self.model_slugs.get(slug)
+        if model is None and not self.tortoise_models_indexed:
+            self._index_tortoise_models()
+            model = self.model_slugs.get(slug)
+        return model
+
+    def get_sidebar(self) -> List[dict]:
+        if self.sidebar is None:
+            self.sidebar = build_sidebar(self.resources)
+        return self.sidebar
 
     def get_model_resource(self, model: Type[Model]):
         r = self.model_resources.get(model)
@@ -75,5 +112,5 @@ app = FastAPIAdmin(
     title="FastAdmin",
     description="A fast admin dashboard based on fastapi and tortoise-orm with tabler ui.",
 )
-app.add_middleware(BaseHTTPMiddleware, dispatch=middlewares.language_processor)
+app.add_middleware(middlewares.LanguageProcessorMiddleware)
 app.include_router(router)
@@ -11,3 +11,5 @@ DATE_FORMAT_MOMENT = "YYYY-MM-DD"
 CAPTCHA_ID = "captcha:{captcha_id}"
 LOGIN_ERROR_TIMES = "login_error_times:{ip}"
 LOGIN_USER = "login_user:{token}"
+FILTER_OPTIONS = "filter_options:{model}:{column}"
+FILTER_OPTIONS_TTL = 300
@@ -1,4 +1,6 @@
 import os
+from contextvars import ContextVar
+from typing import Optional
 
 from babel.support import Translations
 
@@ -10,15 +12,35 @@ TRANSLATIONS = {
     "en_US": Translations.load(os.path.join(BASE_DIR, "locales"), locales=["en_US"]),
 }
 
-translations = TRANSLATIONS.get("en_US")
+default_locale = "en_US"
+# the locale of the current request, set by the language middleware
+request_locale: ContextVar[Optional[str]] = ContextVar("request_locale", default=None)
 
 
-def set_locale(locale: str):
-    global translations
-    translations = TRANSLATIONS.get(locale) or TRANSLATIONS.get("en_US")
-    templates.env.install_gettext_translations(translations)
-    translations.install(locale)
+def set_default_locale(locale: str):
+    global default_locale
+    default_locale = locale if locale in TRANSLATIONS else "en_US"
+
+
+def set_locale(locale: Optional[str]):
+    request_locale.set(locale if locale in TRANSLATIONS else None)
+
+
+def get_locale() -> str:
+    return request_locale.get() or default_locale
+
+
+def get_translations() -> Translations:
+    return TRANSLATIONS[get_locale()]
 
 
 def _(msg: str):
-    return translations.ugettext(msg)
+    return get_translations().ugettext(msg)
+
+
+def ngettext(singular: str, plural: str, n: int):
+    return get_translations().ungettext(singular, plural, n)
+
+
+# installed once, the callables look up the translations of the current request
+templates.env.install_gettext_callables(gettext=_, ngettext=ngettext)
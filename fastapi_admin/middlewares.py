@@ -1,11 +1,14 @@
-from typing import Callable
+from http.cookies import SimpleCookie
+from typing import Optional
 
+from starlette.datastructures import MutableHeaders
 from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from fastapi_admin import i18n
 
 
-async def language_processor(request: Request, call_next: Callable):
+def get_request_locale(request: Request) -> Optional[str]:
     locale = request.query_params.get("language")
     if not locale:
         locale = request.cookies.get("language")
@@ -15,8 +18,39 @@ async def language_processor(request: Request, call_next: Callable):
                 locale = accept_language.split(",")[0].replace("-", "_")
             else:
                 locale = None
-    i18n.set_locale(locale)
-    response = await call_next(request)
-    if locale:
-        response.set_cookie(key="language", value=locale)
-    return response
+    return locale
+
+
+def language_cookie(locale: str) -> str:
+    cookie = SimpleCookie()
+    cookie["language"] = locale
+    cookie["language"]["path"] = "/"
+    cookie["language"]["samesite"] = "lax"
+    return cookie.output(header="").strip()
+
+
+class LanguageProcessorMiddleware:
+    """
+    Resolve the locale of the request and remember it in the language cookie, as a plain ASGI middleware
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        locale = get_request_locale(Request(scope))
+        i18n.set_locale(locale)
+        if not locale:
+            await self.app(scope, receive, send)
+            return
+        cookie = language_cookie(locale)
+
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("set-cookie", cookie)
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,13 +1,15 @@
+import asyncio
 import typing
 import uuid
-from typing import Type
+from time import monotonic, perf_counter
+from typing import Dict, Optional, Tuple, Type
 
 from aioredis import Redis
 from fastapi import Depends, Form
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
 from starlette.requests import Request
-from starlette.responses import RedirectResponse
+from starlette.responses import RedirectResponse, Response
 from starlette.status import HTTP_303_SEE_OTHER, HTTP_401_UNAUTHORIZED
+from starlette.types import ASGIApp, Receive, Scope, Send
 from tortoise import signals
 
 from fastapi_admin import constants
@@ -22,10 +24,32 @@ if typing.TYPE_CHECKING:
     from fastapi_admin.app import FastAPIAdmin
 
 
+class AuthenticationMiddleware:
+    """
+    Attach the logged in admin to the request state, as a plain ASGI middleware
+    """
+
+    def __init__(self, app: ASGIApp, provider: "UsernamePasswordProvider"):
+        self.app = app
+        self.provider = provider
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        response = await self.provider.authenticate(Request(scope, receive))
+        if response:
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+
 class UsernamePasswordProvider(Provider):
     name = "login_provider"
 
     access_token = "access_token"
+    session_ttl = 30
+    session_channel = "fastapi_admin:sessions"
 
     def __init__(
         self,
@@ -43,6 +67,12 @@ class UsernamePasswordProvider(Provider):
         self.login_title = login_title
         self.login_logo_url = login_logo_url
         self.password_path = '/password'
+        self.sessions: Dict[str, Tuple[float, AbstractAdmin]] = {}
+        self.session_hits = 0
+        self.session_misses = 0
+        self.session_lookup_time = 0.0
+        self.session_listener: Optional[asyncio.Task] = None
+        self.redis: Optional[Redis] = None
 
     async def login_view(
         self,
@@ -63,12 +93,15 @@ class UsernamePasswordProvider(Provider):
         app.get(login_path)(self.login_view)
         app.post(login_path)(self.login)
         app.get(self.logout_path)(self.logout)
-        app.add_middleware(BaseHTTPMiddleware, dispatch=self.authenticate)
+        app.add_middleware(AuthenticationMiddleware, provider=self)
         app.get("/init")(self.init_view)
         app.post("/init")(self.init)
         app.get("/password")(self.password_view)
         app.post("/password")(self.password)
         signals.pre_save(self.admin_model)(self.pre_save_admin)
+        signals.post_save(self.admin_model)(self.post_save_admin)
+        self.redis = app.redis
+        self.session_listener = asyncio.create_task(self.listen_sessions(app.redis))
 
     async def pre_save_admin(self, _, instance: AbstractAdmin, using_db, update_fields):
         if instance.pk:
@@ -78,6 +111,10 @@ class UsernamePasswordProvider(Provider):
         else:
             instance.password = instance.password
 
+    async def post_save_admin(self, _, instance: AbstractAdmin, created, using_db, update_fields):
+        if not created:
+            await self.invalidate_sessions(admin_id=instance.pk)
+
     async def login(self, request: Request, redis: Redis = Depends(get_redis)):
         form = await request.form()
         username = form.get("username")
@@ -113,28 +150,89 @@ class UsernamePasswordProvider(Provider):
         response.delete_cookie(self.access_token, path=request.app.admin_path)
         token = request.cookies.get(self.access_token)
         await request.app.redis.delete(constants.LOGIN_USER.format(token=token))
+        await self.invalidate_sessions(token=token)
         return response
 
-    async def authenticate(
-        self,
-        request: Request,
-        call_next: RequestResponseEndpoint,
-    ):
+    async def get_admin(self, redis: Redis, token: str) -> Optional[AbstractAdmin]:
+        """
+        resolve the admin of a session token, from the in process session cache when possible
+        """
+        cached = self.sessions.get(token)
+        if cached and cached[0] > monotonic():
+            self.session_hits += 1
+            return cached[1]
+        start = perf_counter()
+        admin_id = await redis.get(constants.LOGIN_USER.format(token=token))
+        admin = await self.admin_model.get_or_none(pk=admin_id) if admin_id else None
+        self.session_lookup_time += perf_counter() - start
+        self.session_misses += 1
+        if admin:
+            if len(self.sessions) >= 1024:
+                now = monotonic()
+                self.sessions = {k: v for k, v in self.sessions.items() if v[0] > now}
+            self.sessions[token] = (monotonic() + self.session_ttl, admin)
+        return admin
+
+    async def invalidate_sessions(self, token: Optional[str] = None, admin_id: Optional[int] = None):
+        """
+        drop sessions from this process and tell the other workers to do the same
+        """
+        message = f"token:{token}" if token else f"admin:{admin_id}"
+        self._drop_sessions(message)
+        if self.redis:
+            await self.redis.publish(self.session_channel, message)
+
+    def _drop_sessions(self, message: str):
+        kind, _, value = message.partition(":")
+        if kind == "token":
+            self.sessions.pop(value, None)
+        elif kind == "admin":
+            self.sessions = {k: v for k, v in self.sessions.items() if str(v[1].pk) != value}
+
+    async def listen_sessions(self, redis: Redis):
+        while True:
+            try:
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(self.session_channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        data = message["data"]
+                        self._drop_sessions(data.decode() if isinstance(data, bytes) else data)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.sessions.clear()
+                await asyncio.sleep(1)
+
+    def session_stats(self) -> dict:
+        """
+        hit rate of the session cache and the lookup time it saved, estimated from the average cost of a miss
+        """
+        lookups = self.session_hits + self.session_misses
+        miss_cost = self.session_lookup_time / self.session_misses if self.session_misses else 0
+        return {
+            "hits": self.session_hits,
+            "misses": self.session_misses,
+            "hit_rate": self.session_hits / lookups if lookups else 0,
+            "avg_lookup_ms": miss_cost * 1000,
+            "saved_ms": self.session_hits * miss_cost * 1000,
+        }
+
+    async def authenticate(self, request: Request) -> Optional[Response]:
+        """
+        set request.state.admin, return a response to short circuit the request
+        """
         redis = request.app.redis  # type:Redis
         token = request.cookies.get(self.access_token)
         path = request.scope["path"]
         admin = None
         if token:
-            token_key = constants.LOGIN_USER.format(token=token)
-            admin_id = await redis.get(token_key)
-            admin = await self.admin_model.get_or_none(pk=admin_id)
+            admin = await self.get_admin(redis, token)
         request.state.admin = admin
 
         if path == self.login_path and admin:
             return RedirectResponse(url=request.app.admin_path, status_code=HTTP_303_SEE_OTHER)
-
-        response = await call_next(request)
-        return response
+        return None
 
     async def create_user(self, username: str, password: str, **kwargs):
         return await self.admin_model.create(username=username, password=password, **kwargs)
@@ -1,4 +1,7 @@
-from typing import Any, Dict, List, Optional, Tuple, Type, Union
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type, Union
 
 from pydantic import BaseModel, validator
 from starlette.datastructures import FormData
@@ -7,11 +10,15 @@ from tortoise import ForeignKeyFieldInstance, ManyToManyFieldInstance
 from tortoise import Model as TortoiseModel
 from tortoise.fields import BooleanField, DateField, DatetimeField, JSONField
 from tortoise.fields.data import CharEnumFieldInstance, IntEnumFieldInstance, IntField, TextField
+from tortoise.exceptions import BaseORMException
+from tortoise.expressions import Q
 from tortoise.queryset import QuerySet
 
 from fastapi_admin.enums import Method
 from fastapi_admin.exceptions import NoSuchFieldFound
+from fastapi_admin import i18n
 from fastapi_admin.i18n import _
+from fastapi_admin.utils import decode_cursor, encode_cursor
 from fastapi_admin.widgets import Widget, displays, inputs
 from fastapi_admin.widgets.filters import Filter, Search
 
@@ -59,6 +66,15 @@ class ComputeField(Field):
     async def get_value(self, request: Request, obj: dict):
         return obj.get(self.name)
 
+    async def get_values(self, request: Request, objs: List[dict]) -> List[Any]:
+        """
+        Resolve the field for all rows of a page at once, override it to batch lookups into a single query
+        :param request:
+        :param objs: the rows of the page
+        :return: one value per row, in the same order
+        """
+        return [await self.get_value(request, obj) for obj in objs]
+
 
 class Action(BaseModel):
     icon: str
@@ -84,6 +100,56 @@ class Model(Resource):
     page_pre_title: Optional[str] = None
     page_title: Optional[str] = None
     filters: List[Union[str, Filter]] = []
+    # "offset" pages with LIMIT/OFFSET, "keyset" pages with after/before cursors on keyset_field (the pk by default) and the pk
+    pagination: str = "offset"
+    keyset_field: Optional[str] = None
+    # above this many rows an unfiltered list view shows the table statistics estimate instead of running COUNT(*)
+    approximate_count_threshold: Optional[int] = None
+    # rows fetched per query by exports, memory stays bounded by one chunk whatever the table size
+    export_chunk_size: int = 1000
+    # set to True when get_actions, get_bulk_actions or get_toolbar_actions depend on the request,
+    # otherwise they are computed once per locale and reused
+    request_dependent_actions: bool = False
+    actions: List[Action]
+    bulk_actions: List[Action]
+    toolbar_actions: List[ToolbarAction]
+
+    @classmethod
+    def _class_cache(cls, name: str) -> dict:
+        """
+        cache owned by this very class, subclasses get their own
+        """
+        cache = cls.__dict__.get(name)
+        if cache is None:
+            cache = {}
+            setattr(cls, name, cache)
+        return cache
+
+    @classmethod
+    def prepare(cls):
+        """
+        build field metadata once, called when the admin app is configured
+        """
+        cls._class_cache("_meta_cache").clear()
+        for display in (True, False):
+            cls.get_fields(display)
+            cls.get_fields_name(display)
+            cls.get_fields_label(display)
+        cls.get_list_columns()
+
+    async def resolve_actions(self, request: Request):
+        cache = self._class_cache("_actions_cache")
+        locale = i18n.get_locale()
+        actions = None if self.request_dependent_actions else cache.get(locale)
+        if actions is None:
+            actions = (
+                await self.get_actions(request),
+                await self.get_bulk_actions(request),
+                await self.get_toolbar_actions(request),
+            )
+            if not self.request_dependent_actions:
+                cache[locale] = actions
+        self.actions, self.bulk_actions, self.toolbar_actions = actions
 
     async def get_toolbar_actions(self, request: Request) -> List[ToolbarAction]:
         return [
@@ -94,7 +160,15 @@ class Model(Resource):
                 method=Method.GET,
                 ajax=False,
                 class_="btn-dark",
-            )
+            ),
+            ToolbarAction(
+                label=_("export"),
+                icon="fas fa-download",
+                name="export",
+                method=Method.GET,
+                ajax=False,
+                class_="btn-secondary",
+            ),
         ]
 
     async def row_attributes(self, request: Request, obj: dict) -> dict:
@@ -186,6 +260,14 @@ class Model(Resource):
 
     @classmethod
     def _get_fields_attr(cls, attr: str, display: bool = True):
+        cache = cls._class_cache("_meta_cache")
+        key = (attr, display)
+        if key not in cache:
+            cache[key] = cls._build_fields_attr(attr, display)
+        return cache[key]
+
+    @classmethod
+    def _build_fields_attr(cls, attr: str, display: bool = True):
         ret = []
         for field in cls.get_fields():
             if display and isinstance(field.display, displays.InputOnly):
@@ -250,6 +332,14 @@ class Model(Resource):
 
     @classmethod
     def get_fields(cls, is_display: bool = True):
+        cache = cls._class_cache("_meta_cache")
+        key = ("fields", is_display)
+        if key not in cache:
+            cache[key] = cls._build_fields(is_display)
+        return cache[key]
+
+    @classmethod
+    def _build_fields(cls, is_display: bool = True):
         ret = []
         pk_column = cls.model._meta.db_pk_column
         for field in cls.fields or cls.model._meta.fields:
@@ -275,6 +365,128 @@ class Model(Resource):
         ret.insert(0, cls._get_display_input_field(pk_column))
         return ret
 
+    @classmethod
+    def get_list_columns(cls) -> List[str]:
+        """
+        the columns the list view selects, the pk and every displayed field backed by a column
+        """
+        cache = cls._class_cache("_meta_cache")
+        if "list_columns" not in cache:
+            projection = cls.model._meta.fields_db_projection
+            names = [cls.model._meta.pk_attr] + [f.name for f in cls.get_fields() if f.name in projection]
+            cache["list_columns"] = list(dict.fromkeys(names))
+        return cache["list_columns"]
+
+    @classmethod
+    def get_keyset_order(cls) -> List[str]:
+        pk = cls.model._meta.pk_attr
+        if not cls.keyset_field or cls.keyset_field == pk:
+            return [pk]
+        return [cls.keyset_field, pk]
+
+    @classmethod
+    def decode_keyset_cursor(cls, cursor: str, order: List[str]) -> Optional[List[Any]]:
+        """
+        the cursor position with each value converted back to its field type, json leaves dates and decimals as strings
+        """
+        try:
+            position = decode_cursor(cursor)
+            if not isinstance(position, list) or len(position) != len(order):
+                return None
+            fields_map = cls.model._meta.fields_map
+            return [fields_map[name].to_python_value(value) for name, value in zip(order, position)]
+        except (ValueError, TypeError, BaseORMException):
+            return None
+
+    @classmethod
+    async def get_keyset_page(
+        cls, qs: QuerySet, page_size: int, after: Optional[str] = None, before: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str], Optional[str]]:
+        """
+        fetch the page after or before a cursor, the cost does not depend on how deep the page is
+        :return: rows, previous page cursor, next page cursor
+        """
+        order = cls.get_keyset_order()
+        cursor = after or before
+        if cursor:
+            position = cls.decode_keyset_cursor(cursor, order)
+            if position:
+                lookup = "gt" if after else "lt"
+                condition = Q(**{f"{order[-1]}__{lookup}": position[-1]}, **dict(zip(order[:-1], position[:-1])))
+                for i in range(len(order) - 2, -1, -1):
+                    condition = Q(**{f"{order[i]}__{lookup}": position[i]}, **dict(zip(order[:i], position[:i]))) | condition
+                qs = qs.filter(condition)
+        ordering = [f"-{name}" for name in order] if before else order
+        columns = list(dict.fromkeys(cls.get_list_columns() + order))
+        rows = await qs.order_by(*ordering).limit(page_size + 1).values(*columns)
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if before:
+            rows.reverse()
+        if not rows:
+            return rows, None, None
+        prev_cursor = encode_cursor([rows[0][name] for name in order]) if after or (before and has_more) else None
+        next_cursor = encode_cursor([rows[-1][name] for name in order]) if before or has_more else None
+        return rows, prev_cursor, next_cursor
+
+    @classmethod
+    async def iter_chunks(cls, qs: QuerySet, chunk_size: Optional[int] = None) -> AsyncIterator[List[dict]]:
+        """
+        walk the queryset in keyset order one chunk per query, no chunk costs more than the first
+        """
+        chunk_size = chunk_size or cls.export_chunk_size
+        cursor = None
+        while True:
+            page = await cls.get_keyset_page(qs, chunk_size, after=cursor)
+            rows, cursor = page[0], page[2]
+            if rows:
+                yield rows
+            if not cursor:
+                break
+
+    @classmethod
+    async def export(cls, qs: QuerySet, format_: str = "csv") -> AsyncIterator[str]:
+        """
+        the list columns of every row of the queryset as csv or ndjson, streamed chunk by chunk
+        """
+        columns = cls.get_list_columns()
+        if format_ == "ndjson":
+            async for rows in cls.iter_chunks(qs):
+                yield "".join(json.dumps({c: row[c] for c in columns}, default=str) + "\n" for row in rows)
+            return
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        async for rows in cls.iter_chunks(qs):
+            writer.writerows([row[c] for c in columns] for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @classmethod
+    async def estimate_count(cls) -> Optional[int]:
+        """
+        row count estimate from the table statistics, None when the backend does not provide one
+        """
+        try:
+            rows = await cls.model._meta.db.execute_query_dict(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [cls.model._meta.db_table],
+            )
+        except Exception:
+            return None
+        return rows[0]["TABLE_ROWS"] if rows else None
+
+    @classmethod
+    async def get_total(cls, qs: QuerySet, filtered: bool) -> int:
+        if cls.approximate_count_threshold is not None and not filtered:
+            estimate = await cls.estimate_count()
+            if estimate is not None and estimate > cls.approximate_count_threshold:
+                return estimate
+        return await qs.count()
+
     @classmethod
     def get_fields_label(cls, display: bool = True):
         return cls._get_fields_attr("label", display)
@@ -294,6 +506,17 @@ class Dropdown(Resource):
     resources: List[Type[Resource]]
 
 
+async def render_display(request: Request, widget: Widget, value: Any, rendered: dict):
+    try:
+        key = (id(widget), type(value), value)
+        if key in rendered:
+            return rendered[key]
+    except TypeError:
+        return await widget.render(request, value)
+    rendered[key] = await widget.render(request, value)
+    return rendered[key]
+
+
 async def render_values(
     request: Request,
     model: "Model",
@@ -316,20 +539,25 @@ async def render_values(
     cell_attributes: List[List[dict]] = []
     row_attributes: List[dict] = []
     column_attributes: List[dict] = []
-    for field in fields:
+    # identical (widget, value) pairs render to the same output within a page
+    rendered: Dict[Tuple[int, type, Any], Any] = {}
+    computed: Dict[int, List[Any]] = {}
+    for i, field in enumerate(fields):
         column_attributes.append(await model.column_attributes(request, field))
-    for value in values:
+        if isinstance(field, ComputeField):
+            computed[i] = await field.get_values(request, values)
+    for row, value in enumerate(values):
         row_attributes.append(await model.row_attributes(request, value))
         item = []
         cell_item = []
-        for field in fields:
-            if isinstance(field, ComputeField):
-                v = await field.get_value(request, value)
+        for i, field in enumerate(fields):
+            if i in computed:
+                v = computed[i][row]
             else:
                 v = value.get(field.name)
             cell_item.append(await model.cell_attributes(request, value, field))
             if display:
-                item.append(await field.display.render(request, v))
+                item.append(await render_display(request, field.display, v, rendered))
             else:
                 item.append(await field.input.render(request, v))
         ret.append(item)
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, Path
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query
 from jinja2 import TemplateNotFound
 from starlette.requests import Request
-from starlette.responses import RedirectResponse
-from starlette.status import HTTP_303_SEE_OTHER
+from starlette.responses import RedirectResponse, StreamingResponse
+from starlette.status import HTTP_303_SEE_OTHER, HTTP_400_BAD_REQUEST, HTTP_404_NOT_FOUND
 from tortoise import Model
 from tortoise.fields import ManyToManyRelation
 from tortoise.transactions import in_transaction
@@ -12,6 +15,7 @@ from fastapi_admin.resources import Model as ModelResource
 from fastapi_admin.resources import render_values
 from fastapi_admin.responses import redirect
 from fastapi_admin.template import templates
+from fastapi_admin.widgets.inputs import autocomplete_fields
 
 router = APIRouter()
 
@@ -25,19 +29,34 @@ async def list_view(
     resource: str = Path(...),
     page_size: int = 10,
     page_num: int = 1,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
 ):
     fields_label = model_resource.get_fields_label()
     fields = model_resource.get_fields()
     qs = model.all()
     params, qs = await model_resource.resolve_query_params(request, dict(request.query_params), qs)
     filters = await model_resource.get_filters(request, params)
-    total = await qs.count()
-    if page_size:
-        qs = qs.limit(page_size)
+    keyset = model_resource.pagination == "keyset"
+    prev_cursor = next_cursor = None
+    # outside of a transaction each query takes its own pool connection, so count and page run side by side
+    if keyset:
+        page_size = page_size or model_resource.page_size
+        total, (values, prev_cursor, next_cursor) = await asyncio.gather(
+            model_resource.get_total(qs, filtered=bool(params)),
+            model_resource.get_keyset_page(qs, page_size, after, before),
+        )
     else:
-        page_size = model_resource.page_size
-    qs = qs.offset((page_num - 1) * page_size)
-    values = await qs.values()
+        if page_size:
+            page_qs = qs.limit(page_size)
+        else:
+            page_size = model_resource.page_size
+            page_qs = qs
+        page_qs = page_qs.offset((page_num - 1) * page_size)
+        total, values = await asyncio.gather(
+            model_resource.get_total(qs, filtered=bool(params)),
+            page_qs.values(*model_resource.get_list_columns()),
+        )
     rendered_values, row_attributes, column_attributes, cell_attributes = await render_values(
         request, model_resource, fields, values
     )
@@ -57,6 +76,9 @@ async def list_view(
         "resource_label": model_resource.label,
         "page_size": page_size,
         "page_num": page_num,
+        "keyset": keyset,
+        "prev_cursor": prev_cursor,
+        "next_cursor": next_cursor,
         "total": total,
         "from": page_size * (page_num - 1) + 1,
         "to": page_size * page_num,
@@ -75,6 +97,47 @@ async def list_view(
         )
 
 
+@router.get("/{resource}/export")
+async def export(
+    request: Request,
+    model: Model = Depends(get_model),
+    model_resource: ModelResource = Depends(get_model_resource),
+    resource: str = Path(...),
+    format_: str = Query("csv", alias="format", regex="^(csv|ndjson)$"),
+):
+    qs = model.all()
+    _, qs = await model_resource.resolve_query_params(request, dict(request.query_params), qs)
+    media_type = "application/x-ndjson" if format_ == "ndjson" else "text/csv"
+    return StreamingResponse(
+        model_resource.export(qs, format_),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{resource}.{format_}"'},
+    )
+
+
+@router.get("/{resource}/autocomplete")
+async def autocomplete(
+    model: Model = Depends(get_model),
+    q: str = "",
+    field: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    search a related model for autocomplete widgets, a prefix match ordered by the searched field so an index on it is used,
+    only the search fields declared by autocomplete widgets can be searched
+    """
+    if not model:
+        raise HTTPException(status_code=HTTP_404_NOT_FOUND)
+    field = field or model._meta.pk_attr
+    if field not in autocomplete_fields.get(model, ()):
+        raise HTTPException(status_code=HTTP_400_BAD_REQUEST, detail=f"Field {field} is not searchable")
+    qs = model.all()
+    if q:
+        qs = qs.filter(**{f"{field}__startswith": q})
+    objs = await qs.order_by(field).limit(limit)
+    return [{"label": str(obj), "value": obj.pk} for obj in objs]
+
+
 @router.post("/{resource}/update/{pk}")
 async def update(
     request: Request,
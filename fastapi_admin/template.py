@@ -1,9 +1,11 @@
 import os
 from datetime import date
-from typing import Any
+from time import perf_counter
+from typing import Any, Dict
 from urllib.parse import urlencode
 
-from jinja2 import pass_context
+from jinja2 import Environment, FileSystemBytecodeCache, pass_context
+from jinja2.bccache import Bucket
 from starlette.requests import Request
 from starlette.templating import Jinja2Templates
 
@@ -37,3 +39,44 @@ def set_global_env(name: str, value: Any):
 def add_template_folder(*folders: str):
     for folder in folders:
         templates.env.loader.searchpath.insert(0, folder)
+
+
+class BytecodeCache(FileSystemBytecodeCache):
+    """
+    FileSystemBytecodeCache that counts how many templates were loaded from the cache
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def load_bytecode(self, bucket: Bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+
+def set_bytecode_cache(directory: str, env: Environment = templates.env):
+    env.bytecode_cache = BytecodeCache(directory)
+
+
+def precompile(env: Environment = templates.env) -> Dict[str, Any]:
+    """
+    load every html template of the environment up front, so the first requests of a worker do not pay for compiling
+    """
+    cache = env.bytecode_cache
+    hits, misses = getattr(cache, "hits", 0), getattr(cache, "misses", 0)
+    start = perf_counter()
+    templates_ = env.list_templates(extensions=("html",))
+    for name in templates_:
+        env.get_template(name)
+    return {
+        "templates": len(templates_),
+        "cached": getattr(cache, "hits", 0) - hits,
+        "compiled": getattr(cache, "misses", 0) - misses,
+        "seconds": perf_counter() - start,
+    }
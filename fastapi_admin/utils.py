@@ -1,5 +1,8 @@
+import json
 import random
 import string
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from typing import Any, List
 
 import bcrypt
 
@@ -22,3 +25,18 @@ def check_password(password: str, password_hash: str) -> bool:
 
 def hash_password(password: str):
     return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+
+
+def cursor_value(value: Any) -> str:
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """
+    json has no date or decimal type, those values are written as strings and read back as strings by decode_cursor
+    """
+    return urlsafe_b64encode(json.dumps(values, default=cursor_value).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    return json.loads(urlsafe_b64decode(cursor.encode()))
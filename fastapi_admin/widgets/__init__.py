@@ -1,5 +1,6 @@
-from typing import Any
+from typing import Any, Optional
 
+from jinja2 import Template
 from starlette.requests import Request
 from starlette.templating import Jinja2Templates
 
@@ -16,10 +17,19 @@ class Widget:
         :param context:
         """
         self.context = context
+        self._template: Optional[Template] = None
+
+    def get_template(self) -> Template:
+        """
+        The compiled template is resolved once and held by the widget
+        """
+        if getattr(self, "_template", None) is None:
+            self._template = self.templates.get_template(self.template)
+        return self._template
 
     async def render(self, request: Request, value: Any):
         if value is None:
             value = ""
         if not self.template:
             return value
-        return self.templates.get_template(self.template).render(value=value, **self.context)
+        return self.get_template().render(value=value, **self.context)
@@ -1,6 +1,6 @@
 import json
 from datetime import datetime
-from typing import Optional, Type
+from typing import Any, Optional, Type
 
 from starlette.requests import Request
 from tortoise.models import Model
@@ -21,9 +21,7 @@ class DatetimeDisplay(Display):
         self.format_ = format_
 
     async def render(self, request: Request, value: datetime):
-        return await super(DatetimeDisplay, self).render(
-            request, value.strftime(self.format_) if value else None
-        )
+        return value.strftime(self.format_) if value else ""
 
 
 class DateDisplay(DatetimeDisplay):
@@ -38,7 +36,15 @@ class InputOnly(Display):
 
 
 class Boolean(Display):
-    template = "widgets/displays/boolean.html"
+    """
+    There are only two possible outputs, so they are static markup rather than a template
+    """
+
+    true = '<span class="badge bg-green">true</span>'
+    false = '<span class="badge bg-red">false</span>'
+
+    async def render(self, request: Request, value: Any):
+        return self.true if value else self.false
 
 
 class Image(Display):
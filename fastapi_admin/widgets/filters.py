@@ -1,14 +1,16 @@
 import abc
+import json
 from enum import Enum as EnumCLS
-from typing import Any, Optional, Tuple, Type
+from typing import Any, Dict, List, Optional, Set, Tuple, Type
 
 import pendulum
+from aioredis import Redis
 from starlette.requests import Request
-from tortoise import Model
+from tortoise import Model, signals
 from tortoise.queryset import QuerySet
 
 from fastapi_admin import constants
-from fastapi_admin.widgets.inputs import Input
+from fastapi_admin.widgets.inputs import Input, autocomplete_url, get_autocomplete_options, register_autocomplete
 
 
 class Filter(Input):
@@ -132,21 +134,39 @@ class Enum(Select):
         super().__init__(name=name, label=label, null=null)
         self.enum = enum
         self.enum_type = enum_type
+        # the members of an enum never change, so the options are built once
+        self.options = [(v.name, v.value) for v in self.enum]
+        if null:
+            self.options = [("", "")] + self.options
 
     async def parse_value(self, request: Request, value: Any):
         return self.enum(self.enum_type(value))
 
     async def get_options(self):
-        options = [(v.name, v.value) for v in self.enum]
-        if self.context.get("null"):
-            options = [("", "")] + options
-        return options
+        return self.options
 
 
 class ForeignKey(Select):
-    def __init__(self, model: Type[Model], name: str, label: str, null: bool = True):
+    def __init__(
+        self,
+        model: Type[Model],
+        name: str,
+        label: str,
+        null: bool = True,
+        autocomplete: bool = False,
+        search_field: Optional[str] = None,
+    ):
+        """
+        :param autocomplete: only render the selected row and search the related model as the user types
+        :param search_field: field the autocomplete matches by prefix, the pk by default
+        """
         super().__init__(name=name, label=label, null=null)
         self.model = model
+        self.autocomplete = autocomplete
+        self.search_field = search_field
+        if autocomplete:
+            self.template = "widgets/filters/autocomplete.html"
+            register_autocomplete(model, search_field)
 
     async def get_options(self):
         ret = await self.get_models()
@@ -167,27 +187,92 @@ class ForeignKey(Select):
     async def render(self, request: Request, value: Any):
         if value is not None:
             value = int(value)
-        return await super().render(request, value)
+        if not self.autocomplete:
+            return await super().render(request, value)
+        self.context.update(
+            options=await get_autocomplete_options(self.model, value, self.context.get("null")),
+            autocomplete_url=autocomplete_url(request, self.model),
+            search_field=self.search_field or self.model._meta.pk_attr,
+        )
+        return await super(Select, self).render(request, value)
 
 
 class DistinctColumn(Select):
-    def __init__(self, model: Type[Model], name: str, label: str, null: bool = True):
+    # cached columns by model, so a single pair of signal handlers per model invalidates all of them
+    cached_columns: Dict[Type[Model], Set[str]] = {}
+    # set by FastAPIAdmin.configure
+    redis: Optional[Redis] = None
+
+    def __init__(
+        self,
+        model: Type[Model],
+        name: str,
+        label: str,
+        null: bool = True,
+        ttl: int = constants.FILTER_OPTIONS_TTL,
+    ):
+        """
+        :param ttl: seconds the distinct values are cached in redis, which bounds staleness from
+            queryset updates and raw sql that don't send signals, 0 disables the cache
+        """
         super().__init__(name=name, label=label, null=null)
         self.model = model
         self.name = name
+        self.ttl = ttl
+        if ttl:
+            self.watch(model, name)
+
+    @classmethod
+    def watch(cls, model: Type[Model], name: str):
+        if model not in cls.cached_columns:
+            cls.cached_columns[model] = set()
+            signals.post_save(model)(cls.on_save)
+            signals.post_delete(model)(cls.on_delete)
+        cls.cached_columns[model].add(name)
+
+    @classmethod
+    def cache_key(cls, model: Type[Model], name: str) -> str:
+        return constants.FILTER_OPTIONS.format(model=model.__name__.lower(), column=name)
+
+    @classmethod
+    async def on_save(cls, sender: Type[Model], instance: Model, created, using_db, update_fields):
+        if not cls.redis:
+            return
+        columns = cls.cached_columns.get(sender, set())
+        if update_fields:
+            columns = columns.intersection(update_fields)
+        for column in columns:
+            # a value already in the options doesn't change them, which keeps frequent saves from emptying the cache
+            key = cls.cache_key(sender, column)
+            cached = await cls.redis.get(key)
+            if cached is not None and str(getattr(instance, column, None)) not in json.loads(cached):
+                await cls.redis.delete(key)
+
+    @classmethod
+    async def on_delete(cls, sender: Type[Model], instance: Model, using_db):
+        if not cls.redis:
+            return
+        keys = [cls.cache_key(sender, column) for column in cls.cached_columns.get(sender, ())]
+        if keys:
+            await cls.redis.delete(*keys)
 
     async def get_options(self):
-        ret = await self.get_values()
-        options = [
-            (
-                str(x[0]),
-                str(x[0]),
-            )
-            for x in ret
-        ]
+        options = [(x, x) for x in await self.get_cached_values()]
         if self.context.get("null"):
             options = [("", "")] + options
         return options
 
+    async def get_cached_values(self) -> List[str]:
+        redis = DistinctColumn.redis
+        if not self.ttl or not redis:
+            return [str(x[0]) for x in await self.get_values()]
+        key = self.cache_key(self.model, self.name)
+        cached = await redis.get(key)
+        if cached is not None:
+            return json.loads(cached)
+        values = [str(x[0]) for x in await self.get_values()]
+        await redis.set(key, json.dumps(values), ex=self.ttl)
+        return values
+
     async def get_values(self):
         return await self.model.all().distinct().values_list(self.name)
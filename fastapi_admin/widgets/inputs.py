@@ -1,7 +1,7 @@
 import abc
 import json
 from enum import Enum as EnumCLS
-from typing import Any, List, Optional, Tuple, Type
+from typing import Any, Dict, List, Optional, Set, Tuple, Type
 
 from starlette.datastructures import UploadFile
 from starlette.requests import Request
@@ -97,9 +97,21 @@ class ForeignKey(Select):
         null: bool = False,
         disabled: bool = False,
         help_text: Optional[str] = None,
+        autocomplete: bool = False,
+        search_field: Optional[str] = None,
     ):
+        """
+        :param autocomplete: only render the selected row and search the related model as the user types,
+            for related tables too large to list
+        :param search_field: field the autocomplete matches by prefix, the pk by default
+        """
         super().__init__(help_text=help_text, default=default, null=null, disabled=disabled)
         self.model = model
+        self.autocomplete = autocomplete
+        self.search_field = search_field
+        if autocomplete:
+            self.template = "widgets/inputs/autocomplete.html"
+            register_autocomplete(model, search_field)
 
     async def get_options(self):
         ret = await self.get_queryset()
@@ -111,6 +123,43 @@ class ForeignKey(Select):
     async def get_queryset(self):
         return await self.model.all()
 
+    async def render(self, request: Request, value: Any):
+        if not self.autocomplete:
+            return await super().render(request, value)
+        if value is None:
+            value = self.default
+        options = await get_autocomplete_options(self.model, value, self.context.get("null"))
+        self.context.update(
+            options=options,
+            autocomplete_url=autocomplete_url(request, self.model),
+            search_field=self.search_field or self.model._meta.pk_attr,
+        )
+        return await super(Select, self).render(request, value)
+
+
+# the fields the autocomplete endpoint may search, by model, only those declared by autocomplete widgets
+autocomplete_fields: Dict[Type[Model], Set[str]] = {}
+
+
+def register_autocomplete(model: Type[Model], search_field: Optional[str] = None):
+    autocomplete_fields.setdefault(model, set()).add(search_field or model._meta.pk_attr)
+
+
+def autocomplete_url(request: Request, model: Type[Model]) -> str:
+    return f"{request.app.admin_path}/{model.__name__.lower()}/autocomplete"
+
+
+async def get_autocomplete_options(model: Type[Model], value: Any, null: bool = False) -> List[Tuple[str, Any]]:
+    """
+    options of an autocomplete select, only the selected row is loaded
+    """
+    options = [("", "")] if null else []
+    if value not in (None, ""):
+        obj = await model.get_or_none(pk=value)
+        if obj:
+            options.append((str(obj), obj.pk))
+    return options
+
 
 class ManyToMany(Select):
     template = "widgets/inputs/many_to_many.html"
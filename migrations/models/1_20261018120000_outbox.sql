@@ -0,0 +1,15 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS `Outbox` (
+    `outbox_id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `kind` VARCHAR(64) NOT NULL,
+    `subject` VARCHAR(255) NOT NULL,
+    `payload` JSON NOT NULL,
+    `status` VARCHAR(7) NOT NULL  COMMENT 'pending: pending\nsending: sending\nsent: sent\nfailed: failed' DEFAULT 'pending',
+    `attempts` INT NOT NULL  DEFAULT 0,
+    `next_attempt` DATETIME(6),
+    `last_error` LONGTEXT,
+    `created` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    KEY `idx_Outbox_status_3c6a2e` (`status`, `next_attempt`)
+) CHARACTER SET utf8mb4;
+-- downgrade --
+DROP TABLE IF EXISTS `Outbox`;
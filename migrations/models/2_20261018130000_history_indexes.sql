@@ -0,0 +1,6 @@
+-- upgrade --
+ALTER TABLE `Deposits` ADD INDEX `idx_Deposits_account_4b8a6c` (`account_id`, `payment_date`, `deposit_id`);
+ALTER TABLE `Withdrawals` ADD INDEX `idx_Withdrawa_account_9d2f51` (`account_id`, `withdrawal_date`, `withdrawal_id`);
+-- downgrade --
+ALTER TABLE `Deposits` DROP INDEX `idx_Deposits_account_4b8a6c`;
+ALTER TABLE `Withdrawals` DROP INDEX `idx_Withdrawa_account_9d2f51`;
@@ -0,0 +1,15 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS `Ledger` (
+    `entry_id` BIGINT NOT NULL PRIMARY KEY AUTO_INCREMENT,
+    `amount` DOUBLE NOT NULL,
+    `kind` VARCHAR(10) NOT NULL  COMMENT 'settlement: settlement\nreferral: referral\nwithdrawal: withdrawal\nadjustment: adjustment',
+    `reference` BIGINT,
+    `checkpointed` BOOL NOT NULL  DEFAULT 0,
+    `created` DATETIME(6) NOT NULL  DEFAULT CURRENT_TIMESTAMP(6),
+    `account_id` BIGINT NOT NULL,
+    CONSTRAINT `fk_Ledger_Accounts_5e1f0c2a` FOREIGN KEY (`account_id`) REFERENCES `Accounts` (`account_id`) ON DELETE CASCADE,
+    KEY `idx_Ledger_account_7c2d41` (`account_id`, `checkpointed`),
+    KEY `idx_Ledger_checkpo_a83e5b` (`checkpointed`, `entry_id`)
+) CHARACTER SET utf8mb4;
+-- downgrade --
+DROP TABLE IF EXISTS `Ledger`;
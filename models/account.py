@@ -9,6 +9,13 @@ from . import to_camel_case, random_id
 from utils import now, timedelta, datetime
 
 
+class LedgerKind(str, Enum):
+    settlement = "settlement"
+    referral = "referral"
+    withdrawal = "withdrawal"
+    adjustment = "adjustment"
+
+
 class PlanEnum(str, Enum):
     Basic = "Basic"
     Gold = "Gold"
@@ -120,20 +127,63 @@ class WithdrawalCreate(BaseWithdrawal):
 
 
 class AccountView(BaseAccount):
-    deposits: list[DepositView]
-    withdrawals: list[WithdrawalView]
+    deposits: Optional[list[DepositView]]
+    withdrawals: Optional[list[WithdrawalView]]
+
+
+class BasePage(BaseModel):
+    next_cursor: Optional[str]
+
+    class Config:
+        alias_generator = to_camel_case
+        allow_population_by_field_name = True
+
+
+class DepositPage(BasePage):
+    items: list[DepositView]
+
+
+class WithdrawalPage(BasePage):
+    items: list[WithdrawalView]
 
 
 class PlanView(Plan):
     deposits: list[DepositView]
 
 
+class SettlementReport(BaseModel):
+    deposits: int = 0
+    accounts: int = 0
+    chunks: int = 0
+    elapsed: float = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.deposits / self.elapsed if self.elapsed else 0
+
+
+class BulkChunk(BaseModel):
+    requested: int
+    processed: int = 0
+    failed: bool = False
+    elapsed: float = 0
+
+
+class BulkReport(BaseModel):
+    requested: int = 0
+    processed: int = 0
+    chunks: list[BulkChunk] = []
+    elapsed: float = 0
+
+
 class AccountORM(Model):
     account_id = fields.BigIntField(pk=True)
     user: fields.OneToOneRelation = fields.OneToOneField("models.UserORM", related_name="account", on_delete="CASCADE")
-    balance = fields.FloatField()
+    # the checkpoint, the balance once every checkpointed ledger entry is applied, changed only through the ledger
+    balance = fields.FloatField(default=0)
     deposits: fields.ReverseRelation['DepositORM']
     withdrawals: fields.ReverseRelation['WithdrawalORM']
+    ledger: fields.ReverseRelation['LedgerORM']
 
     def __str__(self):
         return f"{self.account_id}"
@@ -142,6 +192,24 @@ class AccountORM(Model):
         table = 'Accounts'
 
 
+class LedgerORM(Model):
+    """Balance changes, inserted once and never updated except for the checkpointed flag set when compaction folds them in."""
+    entry_id = fields.BigIntField(pk=True)
+    account: fields.ForeignKeyRelation['AccountORM'] = fields.ForeignKeyField("models.AccountORM", related_name="ledger", on_delete="CASCADE")
+    amount = fields.FloatField()
+    kind = fields.CharEnumField(LedgerKind)
+    reference = fields.BigIntField(null=True)
+    checkpointed = fields.BooleanField(default=False)
+    created = fields.DatetimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.entry_id}"
+
+    class Meta:
+        table = "Ledger"
+        indexes = (("account_id", "checkpointed"), ("checkpointed", "entry_id"))
+
+
 class PlanORM(Model):
     name = fields.CharField(pk=True, max_length=256)
     minimum = fields.FloatField()
@@ -174,6 +242,7 @@ class DepositORM(Model):
 
     class Meta:
         table = 'Deposits'
+        indexes = (("account_id", "payment_date", "deposit_id"),)
 
 
 class WithdrawalORM(Model):
@@ -189,6 +258,7 @@ class WithdrawalORM(Model):
 
     class Meta:
         table = "Withdrawals"
+        indexes = (("account_id", "withdrawal_date", "withdrawal_id"),)
 
 
 class ReferralORM(Model):
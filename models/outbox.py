@@ -0,0 +1,30 @@
+from enum import Enum
+
+from tortoise import fields
+from tortoise.models import Model
+
+
+class OutboxStatus(str, Enum):
+    pending = "pending"
+    sending = "sending"
+    sent = "sent"
+    failed = "failed"
+
+
+class OutboxORM(Model):
+    outbox_id = fields.BigIntField(pk=True)
+    kind = fields.CharField(max_length=64)
+    subject = fields.CharField(max_length=255)
+    payload = fields.JSONField()
+    status = fields.CharEnumField(OutboxStatus, default=OutboxStatus.pending)
+    attempts = fields.IntField(default=0)
+    next_attempt = fields.DatetimeField(null=True)
+    last_error = fields.TextField(null=True)
+    created = fields.DatetimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.outbox_id}"
+
+    class Meta:
+        table = "Outbox"
+        indexes = (("status", "next_attempt"),)
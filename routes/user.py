@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, Response
 
 from dependencies.account import create_deposit, create_withdrawal
 from dependencies.auth import get_user_from_token, create_user, verify_user, ResponseModel
-from dependencies.user import get_current_user, update_user
+from dependencies.user import get_current_user, update_user, get_deposits, get_withdrawals
+from models.account import DepositPage, WithdrawalPage
 from models.user import UserView
 
 router = APIRouter(prefix='/user')
@@ -25,6 +26,16 @@ async def get(user: UserView = Depends(get_current_user)) -> UserView:
     return user
 
 
+@router.get('/deposits', response_model=DepositPage)
+async def deposits(page: DepositPage = Depends(get_deposits)) -> DepositPage:
+    return page
+
+
+@router.get('/withdrawals', response_model=WithdrawalPage)
+async def withdrawals(page: WithdrawalPage = Depends(get_withdrawals)) -> WithdrawalPage:
+    return page
+
+
 @router.get('/verify', response_model=ResponseModel)
 async def get(res: ResponseModel = Depends(verify_user)) -> ResponseModel:
     return res
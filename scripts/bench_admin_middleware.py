@@ -0,0 +1,84 @@
+"""Admin requests per second through the language and authentication middlewares, mounted with BaseHTTPMiddleware as they
+were before and as the plain ASGI middlewares that replaced them.
+
+Needs no database or Redis, the admin session is put in the login provider's in process cache so authenticate finds it
+without a lookup. Both stacks serve the same page from a throwaway FastAPI app driven in process through httpx:
+
+    python -m scripts.bench_admin_middleware [requests] [concurrency]
+"""
+import asyncio
+import sys
+from time import monotonic, perf_counter
+from types import SimpleNamespace
+from typing import Callable
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import HTMLResponse
+
+from admin.models import Admin
+from fastapi_admin import i18n
+from fastapi_admin.middlewares import LanguageProcessorMiddleware, get_request_locale
+from fastapi_admin.providers.login import AuthenticationMiddleware, UsernamePasswordProvider
+
+TOKEN = "bench-session"
+PAGE = "<html><body>" + "<p>admin</p>" * 200 + "</body></html>"
+
+
+async def language_processor(request: Request, call_next: Callable):
+    """The language middleware as it was before, a BaseHTTPMiddleware dispatch."""
+    locale = get_request_locale(request)
+    i18n.set_locale(locale)
+    response = await call_next(request)
+    if locale:
+        response.set_cookie(key="language", value=locale)
+    return response
+
+
+def make_app(provider: UsernamePasswordProvider, plain_asgi: bool) -> FastAPI:
+    app = FastAPI()
+    app.redis = None
+
+    @app.get("/admin")
+    async def home(request: Request):
+        return HTMLResponse(PAGE if request.state.admin else "")
+
+    # in the order the admin app mounts them, the provider registers its middleware last so it runs first
+    if plain_asgi:
+        app.add_middleware(LanguageProcessorMiddleware)
+        app.add_middleware(AuthenticationMiddleware, provider=provider)
+    else:
+        async def authenticate(request: Request, call_next: Callable):
+            # the provider dispatch as it was before, authenticate then hand on to call_next
+            return await provider.authenticate(request) or await call_next(request)
+
+        app.add_middleware(BaseHTTPMiddleware, dispatch=language_processor)
+        app.add_middleware(BaseHTTPMiddleware, dispatch=authenticate)
+    return app
+
+
+async def throughput(app: FastAPI, requests: int, concurrency: int) -> float:
+    remaining = iter(range(requests))
+    async with AsyncClient(app=app, base_url="http://bench", cookies={"access_token": TOKEN, "language": "en_US"}) as client:
+        async def worker():
+            for _ in remaining:
+                response = await client.get("/admin")
+                assert response.status_code == 200 and response.text
+
+        start = perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (perf_counter() - start)
+
+
+async def bench(requests: int = 5000, concurrency: int = 50):
+    provider = UsernamePasswordProvider(admin_model=Admin)
+    provider.sessions[TOKEN] = (monotonic() + 3600, SimpleNamespace(pk=1))
+    for plain_asgi in (False, True):
+        rate = await throughput(make_app(provider, plain_asgi), requests, concurrency)
+        print(f"{'plain ASGI' if plain_asgi else 'BaseHTTPMiddleware'}: {rate:.0f} requests/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(*(int(arg) for arg in sys.argv[1:3])))
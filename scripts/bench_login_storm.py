@@ -0,0 +1,72 @@
+"""Latency of an unrelated endpoint while a burst of logins verifies passwords, with bcrypt run inline on the event loop
+and through verify_password, which hands it to the hashing pool.
+
+Needs no database, both endpoints run in a throwaway FastAPI app driven in process through httpx:
+
+    python -m scripts.bench_login_storm [logins] [pings]
+
+Pool size and concurrency cap come from HASH_WORKERS and HASH_CONCURRENCY as in the app.
+"""
+import asyncio
+import sys
+from time import perf_counter
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from dependencies.auth import pwd_context, verify_password
+
+PASSWORD = "storm-password"
+
+
+def make_app(hashed: str, pooled: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/login")
+    async def login():
+        if pooled:
+            return {"ok": await verify_password(PASSWORD, hashed)}
+        return {"ok": pwd_context.verify(PASSWORD, hashed)}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+def percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def storm(hashed: str, pooled: bool, logins: int, pings: int) -> list[float]:
+    app = make_app(hashed, pooled)
+    latencies = []
+    async with AsyncClient(app=app, base_url="http://bench") as client:
+        async def ping():
+            start = perf_counter()
+            await client.get("/ping")
+            latencies.append((perf_counter() - start) * 1000)
+
+        async def pinger():
+            for _ in range(pings):
+                await ping()
+                await asyncio.sleep(0.005)
+
+        await asyncio.gather(pinger(), *(client.post("/login") for _ in range(logins)))
+    return latencies
+
+
+async def bench(logins: int = 50, pings: int = 200):
+    hashed = pwd_context.hash(PASSWORD)
+    for pooled in (False, True):
+        start = perf_counter()
+        latencies = await storm(hashed, pooled, logins, pings)
+        elapsed = perf_counter() - start
+        print(f"{'pooled' if pooled else 'inline'}: {logins} logins and {pings} pings in {elapsed:.2f}s, ping latency "
+              f"p50 {percentile(latencies, 50):.1f}ms, p99 {percentile(latencies, 99):.1f}ms, max {max(latencies):.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(bench(*(int(arg) for arg in sys.argv[1:3])))
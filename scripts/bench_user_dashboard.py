@@ -0,0 +1,79 @@
+"""Time the /user/me dashboard built by get_current_user against the previous fetch_related and from_orm implementation, at
+10, 100 and 1000 deposits on the account.
+
+Run against a development database seeded by scripts/connection.py:
+
+    python -m scripts.bench_user_dashboard [iterations]
+
+Both paths are timed including the response model validating and serialising the payload, as FastAPI does on the way out.
+The deposits the run adds are deleted at the end.
+"""
+import sys
+from time import perf_counter
+
+from tortoise import Tortoise, run_async
+
+from config.db import TORTOISE_ORM
+from dependencies.user import get_current_user
+from models.account import Account, AccountORM, AccountView, Deposit, DepositORM, DepositView, PlanEnum, ReferralView, WithdrawalView
+from models.user import User, UserORM, UserView
+
+SIZES = (10, 100, 1000)
+
+
+async def previous_current_user(user: UserORM) -> UserView:
+    """get_current_user as it was before the dashboard was read with column-limited queries."""
+    await user.fetch_related('account', 'referrals')
+    account: AccountORM = user.account
+    acc = Account.from_orm(account)
+    await account.fetch_related('deposits', 'withdrawals')
+    deposits = [DepositView.from_orm(deposit) for deposit in account.deposits]
+    withdrawals = [WithdrawalView.from_orm(wit) for wit in account.withdrawals]
+    referrals = [ReferralView.from_orm(ref) for ref in user.referrals]
+    account_details = AccountView(deposits=deposits, withdrawals=withdrawals, **acc.dict())
+    user_ = User.from_orm(user)
+    user_view = UserView(**user_.dict())
+    user_view.account_details = account_details
+    user_view.referrals = referrals
+    return user_view
+
+
+def serialise(view: UserView) -> str:
+    return UserView.parse_obj(view.dict(by_alias=True)).json(by_alias=True)
+
+
+async def timed(load, email: str, iterations: int) -> float:
+    start = perf_counter()
+    for _ in range(iterations):
+        # a fresh instance each time, like the one get_user_from_token hands the route
+        user = await UserORM.get(email=email).prefetch_related("account")
+        serialise(await load(user))
+    return (perf_counter() - start) / iterations * 1000
+
+
+async def bench(iterations: int = 20):
+    await Tortoise.init(config=TORTOISE_ORM)
+    account = await AccountORM.first()
+    if account is None:
+        print("No account to load, seed the database first")
+        return
+    email = (await UserORM.get(user_id=account.user_id)).email
+    existing = await DepositORM.filter(account_id=account.account_id).count()
+    plan = list(PlanEnum)[0]
+    added: list[int] = []
+    try:
+        for size in SIZES:
+            deposits = [DepositORM(**Deposit(plan_id=plan, amount=100, account_id=account.account_id).dict())
+                        for _ in range(size - len(added))]
+            await DepositORM.bulk_create(deposits)
+            added.extend(deposit.deposit_id for deposit in deposits)
+            previous = await timed(previous_current_user, email, iterations)
+            current = await timed(get_current_user, email, iterations)
+            print(f"{existing + size} deposits: previous {previous:.1f}ms, current {current:.1f}ms, {previous / current:.1f}x")
+    finally:
+        await DepositORM.filter(deposit_id__in=added).delete()
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    run_async(bench(*(int(arg) for arg in sys.argv[1:2])))
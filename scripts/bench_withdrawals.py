@@ -0,0 +1,67 @@
+"""Concurrent withdrawals against a single account through create_withdrawal, the path behind POST /withdraw, checking the
+balance is never overdrawn and measuring throughput.
+
+Run against a development database seeded by scripts/connection.py:
+
+    python -m scripts.bench_withdrawals [withdrawals] [amount]
+
+The account is funded so exactly half of the withdrawals can succeed. The withdrawals and queued emails the run creates are
+deleted and the balance the account started with is restored at the end.
+"""
+import asyncio
+import sys
+import uuid
+from time import perf_counter
+from types import SimpleNamespace
+
+from tortoise import Tortoise, run_async
+
+from config.db import TORTOISE_ORM
+from dependencies.account import create_withdrawal
+from dependencies.ledger import get_balance, post_entries
+from models.account import AccountORM, LedgerKind, LedgerORM, WithdrawalCreate, WithdrawalORM
+from models.outbox import OutboxORM
+from models.user import UserORM
+
+
+async def bench(withdrawals: int = 200, amount: float = 10):
+    await Tortoise.init(config=TORTOISE_ORM)
+    account = await AccountORM.first()
+    if account is None:
+        print("No account to withdraw from, seed the database first")
+        return
+    account_id = account.account_id
+    user = await UserORM.get(user_id=account.user_id).prefetch_related("account")
+    # tags the withdrawals of this run so they can be counted and removed
+    wallet_id = f"bench-{uuid.uuid4().hex[:8]}"
+    # create_withdrawal reads the user the auth dependency puts on the request
+    request = SimpleNamespace(state=SimpleNamespace(user=user))
+    start_balance = await get_balance(account_id)
+    last_outbox = await OutboxORM.all().order_by("-outbox_id").first().values_list("outbox_id", flat=True) or 0
+    # fund the account so its balance covers exactly half of the withdrawals
+    funding = withdrawals // 2 * amount - start_balance
+    await post_entries([LedgerORM(account_id=account_id, amount=funding, kind=LedgerKind.adjustment)])
+
+    start = perf_counter()
+    results = await asyncio.gather(*(create_withdrawal(request, WithdrawalCreate(amount=amount, wallet_id=wallet_id))
+                                     for _ in range(withdrawals)))
+    elapsed = perf_counter() - start
+
+    succeeded = sum(result.status for result in results)
+    errors = sum(result.message == "Unable to create request" for result in results)
+    final_balance = await get_balance(account_id)
+    created = await WithdrawalORM.filter(account_id=account_id, wallet_id=wallet_id).count()
+    print(f"{withdrawals} withdrawals of {amount} in {elapsed:.2f}s, {withdrawals / elapsed:.1f}/s")
+    print(f"succeeded: {succeeded}, expected: {withdrawals // 2}, errors: {errors}, withdrawals created: {created}, "
+          f"final balance: {final_balance:.2f}")
+    ok = succeeded == created == withdrawals // 2 and abs(final_balance) < 1e-6
+    print("correct" if ok else "INCORRECT, the balance was overdrawn, debits were lost or requests failed")
+
+    await WithdrawalORM.filter(account_id=account_id, wallet_id=wallet_id).delete()
+    await OutboxORM.filter(outbox_id__gt=last_outbox, kind="WithdrawalEmail").delete()
+    await post_entries([LedgerORM(account_id=account_id, amount=start_balance - final_balance, kind=LedgerKind.adjustment)])
+    await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    run_async(bench(*(int(arg) if i == 0 else float(arg) for i, arg in enumerate(sys.argv[1:3]))))
@@ -0,0 +1,101 @@
+"""A local stand-in SMTP server that accepts any login and keeps the messages it receives instead of delivering them.
+
+It needs aiosmtpd, which is only used here and is not in requirements.txt, install it with `pip install aiosmtpd`.
+Serve on a port and print every message:
+
+    python -m scripts.smtp_server serve [port]
+
+Or check the mail transport against it, sending messages through PooledFastMail and reporting how many SMTP sessions
+delivered them and how many the email_dispatched signal recorded:
+
+    python -m scripts.smtp_server check [messages]
+
+The server speaks plain SMTP without TLS, so check builds its own connection config rather than the SSL one in utils.emails.
+"""
+import asyncio
+import sys
+from email import message_from_bytes
+from threading import Event
+from time import perf_counter
+
+from fastapi_mail import ConnectionConfig, MessageSchema
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import AuthResult
+except ImportError:
+    sys.exit("The stand-in SMTP server needs aiosmtpd, install it with `pip install aiosmtpd`")
+
+from utils.smtp import PooledFastMail, SMTPPool
+
+
+class StandInHandler:
+    def __init__(self, echo: bool = False):
+        self.echo = echo
+        self.sessions = 0
+        self.messages = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        # every session greets once, the pool is working when this stays well below the number of messages
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        message = message_from_bytes(envelope.content)
+        self.messages.append(message)
+        if self.echo:
+            print(f"{envelope.mail_from} -> {', '.join(envelope.rcpt_tos)}: {message['Subject']}")
+        return "250 Message accepted for delivery"
+
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def start(handler: StandInHandler, port: int = 0) -> Controller:
+    controller = Controller(handler, hostname="127.0.0.1", port=port, authenticator=accept_any_login, auth_require_tls=False)
+    controller.start()
+    return controller
+
+
+async def check(messages: int = 200):
+    handler = StandInHandler()
+    controller = start(handler, 8025)
+    config = ConnectionConfig(MAIL_USERNAME="stand-in", MAIL_PASSWORD="stand-in", MAIL_FROM="noreply@example.com",
+                              MAIL_SERVER=controller.hostname, MAIL_PORT=controller.port, MAIL_TLS=False, MAIL_SSL=False,
+                              USE_CREDENTIALS=True, VALIDATE_CERTS=False)
+    pool = SMTPPool(config, size=4)
+    mail = PooledFastMail(config, pool)
+    try:
+        with mail.record_messages() as outbox:
+            start_time = perf_counter()
+            await asyncio.gather(*(mail.send_message(MessageSchema(subject=f"Check {i}", recipients=["user@example.com"],
+                                                                  body="Stand-in check", subtype="plain"))
+                                   for i in range(messages)))
+            elapsed = perf_counter() - start_time
+        await pool.close()
+    finally:
+        controller.stop()
+    print(f"{messages} messages in {elapsed:.2f}s, received: {len(handler.messages)}, SMTP sessions: {handler.sessions}, "
+          f"recorded by email_dispatched: {len(outbox)}")
+
+
+def serve(port: int = 8025):
+    controller = start(StandInHandler(echo=True), port)
+    print(f"Stand-in SMTP server on {controller.hostname}:{controller.port}, Ctrl+C to stop")
+    try:
+        # the controller serves from its own thread
+        Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    command, *args = sys.argv[1:] or ["serve"]
+    if command == "check":
+        asyncio.run(check(*(int(arg) for arg in args[:1])))
+    else:
+        serve(*(int(arg) for arg in args[:1]))
@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from functools import wraps, partial
 
 from pydantic import BaseModel, Field
+from tortoise.queryset import QuerySet
 from tortoise.timezone import localtime, make_aware, now as nw
 
 
@@ -45,3 +46,12 @@ def error_handler(func=None, error=None):
             return ResponseModel(message=err, status=False)
 
     return wrapper
+
+
+async def locked_rows(qs: QuerySet, *fields: str, skip_locked: bool = False, using_db=None) -> list[dict]:
+    """The rows of qs locked FOR UPDATE, as dicts of fields.
+
+    Tortoise leaves FOR UPDATE out of .values() and .values_list() queries, so the rows are read as partial model instances.
+    """
+    objs = await qs.select_for_update(skip_locked=skip_locked).only(*fields).using_db(using_db)
+    return [{field: getattr(obj, field) for field in fields} for obj in objs]
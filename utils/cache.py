@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import pickle
+from collections import OrderedDict
+from copy import copy
+from time import monotonic
+from typing import Any, Hashable, Optional
+
+from aioredis import Redis
+
+from config.env import env
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """A least recently used cache whose entries expire ttl seconds after they are set"""
+
+    def __init__(self, *, size: int = 1024, ttl: float = 30):
+        self.size = size
+        self.ttl = ttl
+        self.items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable, default=None):
+        item = self.items.get(key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires < monotonic():
+            del self.items[key]
+            return default
+        self.items.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.items[key] = (monotonic() + self.ttl, value)
+        self.items.move_to_end(key)
+        while len(self.items) > self.size:
+            self.items.popitem(last=False)
+
+    def pop(self, key: Hashable):
+        self.items.pop(key, None)
+
+
+class ObjectCache:
+    """Two tier cache of pickleable objects, in process first and then in Redis when a client is attached.
+
+    Callers always get a shallow copy, so changes made to a returned object do not leak into the cache. Once started,
+    invalidations are published on a Redis channel so every worker drops the keys from its in process tier, not only the
+    worker that made the change.
+    """
+
+    def __init__(self, prefix: str, *, size: int = 1024, ttl: float = 30, redis: Optional[Redis] = None):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.local = TTLCache(size=size, ttl=ttl)
+        self.redis = redis
+        self.channel = f"{prefix}:invalidations"
+        self.pubsub: Optional[Redis] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is None and self.redis:
+            try:
+                if data := await self.redis.get(self.key(key)):
+                    value = pickle.loads(data)
+                    self.local.set(key, value)
+            except Exception as err:
+                logger.warning("Unable to read %s from redis: %s", self.key(key), err)
+        return copy(value) if value is not None else None
+
+    async def set(self, key: str, value: Any):
+        value = copy(value)
+        self.local.set(key, value)
+        if self.redis:
+            try:
+                await self.redis.set(self.key(key), pickle.dumps(value), ex=int(self.ttl) or 1)
+            except Exception as err:
+                logger.warning("Unable to write %s to redis: %s", self.key(key), err)
+
+    async def invalidate(self, *keys: str):
+        for key in keys:
+            self.local.pop(key)
+        if self.redis and keys:
+            try:
+                await self.redis.delete(*(self.key(key) for key in keys))
+            except Exception as err:
+                logger.warning("Unable to invalidate %s in redis: %s", keys, err)
+        if self.pubsub and keys:
+            try:
+                await self.pubsub.publish(self.channel, json.dumps(keys))
+            except Exception as err:
+                logger.warning("Unable to broadcast the invalidation of %s: %s", keys, err)
+
+    async def listen(self):
+        while True:
+            try:
+                pubsub = self.pubsub.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        for key in json.loads(message["data"]):
+                            self.local.pop(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                # invalidations may have been missed while disconnected
+                logger.warning("Lost the %s invalidation channel: %s", self.prefix, err)
+                self.local.items.clear()
+                await asyncio.sleep(1)
+
+    def start(self, pubsub: Redis):
+        self.pubsub = pubsub
+        self.task = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+
+user_cache = ObjectCache("user", size=int(env.USER_CACHE_SIZE or 10000), ttl=float(env.USER_CACHE_TTL or 30))
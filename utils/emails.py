@@ -1,10 +1,14 @@
 from pathlib import Path
-from typing import Optional
+from typing import ClassVar, Optional
 from datetime import date
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
+from fastapi.encoders import jsonable_encoder
+from fastapi_mail import MessageSchema, ConnectionConfig
 from pydantic import EmailStr, BaseModel, AnyHttpUrl
 from config.env import env
+from models.outbox import OutboxORM
+from . import now
+from .smtp import SMTPPool, PooledFastMail
 
 config = ConnectionConfig(
     MAIL_USERNAME=env.MAIL_USERNAME,
@@ -20,6 +24,10 @@ config = ConnectionConfig(
     VALIDATE_CERTS=True
 )
 
+smtp_pool = SMTPPool(config, size=int(env.MAIL_POOL_SIZE or 4), idle_timeout=float(env.MAIL_POOL_IDLE_TIMEOUT or 60),
+                     max_messages=int(env.MAIL_POOL_MAX_MESSAGES or 100))
+fast_mail = PooledFastMail(config, smtp_pool)
+
 
 class Email(BaseModel):
     name: str
@@ -27,14 +35,15 @@ class Email(BaseModel):
     title: str
     company: str = env.BRAND_NAME
     subject: str
-    fast_mail: FastMail = FastMail(config)
+    # a class variable, a field default would be deep-copied into every email along with its SMTP pool
+    fast_mail: ClassVar[PooledFastMail] = fast_mail
     template_name: str = "base.html"
     subtype: str = "html"
     recipients: list[EmailStr]
 
     class Config:
         arbitrary_types_allowed = True
-        fields = {"template_name": {"exclude": True}, "subject": {"exclude": True}, "subtype": {"exclude": True}, "fast_mail": {"exclude": True}}
+        fields = {"template_name": {"exclude": True}, "subject": {"exclude": True}, "subtype": {"exclude": True}}
 
     def create_message(self):
         return MessageSchema(
@@ -44,14 +53,32 @@ class Email(BaseModel):
             subtype=self.subtype
         )
 
+    async def deliver(self):
+        msg = self.create_message()
+        await self.fast_mail.send_message(msg, template_name=self.template_name)
+
     async def send(self) -> bool:
         try:
-            msg = self.create_message()
-            await self.fast_mail.send_message(msg, template_name=self.template_name)
+            await self.deliver()
             return True
         except Exception:
             return False
 
+    def outbox_entry(self) -> OutboxORM:
+        return OutboxORM(kind=type(self).__name__, subject=self.subject, payload=jsonable_encoder(self.dict()), next_attempt=now())
+
+    async def queue(self, using_db=None) -> OutboxORM:
+        """Write the email to the outbox, inside the current transaction if there is one. The outbox dispatcher sends it."""
+        entry = self.outbox_entry()
+        await entry.save(using_db=using_db)
+        return entry
+
+    @classmethod
+    def from_outbox(cls, entry: OutboxORM) -> "Email":
+        kinds = {kind.__name__: kind for kind in cls.__subclasses__()}
+        kind = kinds.get(entry.kind, cls)
+        return kind(**entry.payload, subject=entry.subject)
+
 
 class VerificationEmail(Email):
     title = "Account Verification"